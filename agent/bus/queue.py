@@ -1,10 +1,15 @@
 """Message bus for inter-component communication."""
 
+import os
+import json
 import asyncio
-from typing import Callable
+from typing import Any, Callable
 
 from agent.bus.events import InboundMessage, OutboundMessage
 
+# 合并多条文本消息时使用的分隔符
+COALESCE_SEPARATOR = "\n\n"
+
 
 class MessageBus:
     """
@@ -13,13 +18,30 @@ class MessageBus:
     Provides two-way async queues:
     - inbound: Messages from channels to agent
     - outbound: Messages from agent to channels
+
+    Consecutive text messages to the same chat published within
+    coalesce_window seconds are merged into one outbound message, as long as
+    the merged text stays under max_message_bytes. File messages, and messages
+    carrying media, reply_to or metadata, are never merged and flush the
+    chat's pending text first, so per-chat order is preserved.
     """
 
-    def __init__(self):
+    def __init__(self, coalesce_window: float | None = None, max_message_bytes: int | None = None):
         self.inbound: asyncio.Queue[InboundMessage] = asyncio.Queue()
         self.outbound: asyncio.Queue[OutboundMessage] = asyncio.Queue()
         self._outbound_subscribers: dict[str, list[Callable]] = {}
 
+        # 出站合并：窗口内同一聊天的连续文本合并为一条（0 表示关闭）
+        if coalesce_window is None:
+            coalesce_window = int(os.getenv("OUTBOUND_COALESCE_MS", "300")) / 1000
+        self.coalesce_window = coalesce_window
+        # 飞书文本消息请求体上限 150KB，按 JSON 编码后的长度计算并留出余量
+        self.max_message_bytes = max_message_bytes or int(os.getenv("OUTBOUND_MAX_MESSAGE_BYTES", "100000"))
+        self._pending: dict[tuple[str, str], list[OutboundMessage]] = {}
+        self._pending_bytes: dict[tuple[str, str], int] = {}
+        self._flush_timers: dict[tuple[str, str], asyncio.TimerHandle] = {}
+        self._merged = 0
+
     # ========== Inbound Flow (Channel → Agent) ==========
 
     async def publish_inbound(self, msg: InboundMessage) -> None:
@@ -37,8 +59,31 @@ class MessageBus:
     # ========== Outbound Flow (Agent → Channel) ==========
 
     async def publish_outbound(self, msg: OutboundMessage) -> None:
-        """Publish an outbound message to a channel."""
-        await self.outbound.put(msg)
+        """Publish an outbound message to a channel (text may be held briefly for coalescing)."""
+        if self.coalesce_window <= 0:
+            await self.outbound.put(msg)
+            return
+
+        key = (msg.channel, msg.chat_id)
+        size = self._encoded_size(msg.content)
+
+        # 文件等不可合并的消息作为屏障：先发出该聊天已缓冲的文本
+        if not self._is_mergeable(msg) or size > self.max_message_bytes:
+            self._flush(key)
+            await self.outbound.put(msg)
+            return
+
+        # 合并后会超过大小上限时，先发出已缓冲的部分
+        if key in self._pending and self._pending_bytes[key] + size > self.max_message_bytes:
+            self._flush(key)
+
+        if key not in self._pending:
+            self._pending[key] = []
+            self._pending_bytes[key] = 0
+            loop = asyncio.get_running_loop()
+            self._flush_timers[key] = loop.call_later(self.coalesce_window, self._flush, key)
+        self._pending[key].append(msg)
+        self._pending_bytes[key] += size
 
     async def consume_outbound(self) -> OutboundMessage:
         """Consume an outbound message (blocking)."""
@@ -48,10 +93,63 @@ class MessageBus:
         """Get the size of the outbound queue."""
         return self.outbound.qsize()
 
+    def flush_outbound(self) -> None:
+        """Release all text held for coalescing into the outbound queue."""
+        for key in list(self._pending):
+            self._flush(key)
+
+    def get_coalesce_stats(self) -> dict[str, Any]:
+        """Get outbound coalescing metrics."""
+        return {
+            "window_ms": int(self.coalesce_window * 1000),
+            "pending_chats": len(self._pending),
+            "pending_messages": sum(len(msgs) for msgs in self._pending.values()),
+            "merged": self._merged,
+        }
+
+    def _flush(self, key: tuple[str, str]) -> None:
+        """Move one chat's buffered text into the outbound queue as a single message."""
+        timer = self._flush_timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        msgs = self._pending.pop(key, None)
+        self._pending_bytes.pop(key, None)
+        if not msgs:
+            return
+
+        if len(msgs) == 1:
+            self.outbound.put_nowait(msgs[0])
+            return
+
+        self._merged += len(msgs) - 1
+        self.outbound.put_nowait(OutboundMessage(
+            channel=msgs[0].channel,
+            chat_id=msgs[0].chat_id,
+            content=COALESCE_SEPARATOR.join(m.content for m in msgs),
+        ))
+
+    @staticmethod
+    def _encoded_size(content: str) -> int:
+        """Size of the text once JSON-encoded into the request body, plus its separator."""
+        return len(json.dumps(content)) + len(COALESCE_SEPARATOR)
+
+    @staticmethod
+    def _is_mergeable(msg: OutboundMessage) -> bool:
+        """Plain text only; file paths are sent as attachments by the channels."""
+        if msg.media or msg.reply_to or msg.metadata:
+            return False
+        return not os.path.isfile(os.path.expanduser(msg.content))
+
     # ========== Utilities ==========
 
     def clear(self) -> None:
-        """Clear all queues."""
+        """Clear all queues (text held for coalescing is dropped too)."""
+        for timer in self._flush_timers.values():
+            timer.cancel()
+        self._flush_timers.clear()
+        self._pending.clear()
+        self._pending_bytes.clear()
+
         while not self.inbound.empty():
             try:
                 self.inbound.get_nowait()
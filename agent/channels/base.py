@@ -119,6 +119,10 @@ class BaseChannel(ABC):
 
         await self.bus.publish_inbound(msg)
 
+    def get_send_stats(self) -> dict[str, Any]:
+        """Get channel-specific send metrics (rate limiting, retries); empty by default."""
+        return {}
+
     @property
     def is_running(self) -> bool:
         """Check if the channel is running."""
@@ -2,14 +2,23 @@
 
 import asyncio
 import json
+import os
+import random
 import threading
 import ssl
+import time
+import uuid
 from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
 from typing import Any
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from agent.bus.events import OutboundMessage
 from agent.bus.queue import MessageBus
 from agent.channels.base import BaseChannel
+from agent.channels.ratelimit import RateLimiter
 from agent.config.schema import FeishuConfig
 
 try:
@@ -37,6 +46,119 @@ MSG_TYPE_MAP = {
     "sticker": "[sticker]",
 }
 
+FEISHU_API_BASE = "https://open.feishu.cn/open-apis"
+
+# Error codes meaning the tenant access token is missing or no longer valid
+TOKEN_INVALID_CODES = {99991661, 99991663}
+
+# Error codes for app-level and per-chat rate limiting; worth retrying after a backoff
+RETRYABLE_CODES = {99991400, 230020}
+
+
+class TenantTokenProvider:
+    """
+    Cached tenant_access_token for one Feishu app.
+
+    The token is reused until shortly before it expires. Inside the refresh
+    margin the cached token is still returned while a new one is fetched in
+    the background; concurrent callers that need a token share a single
+    refresh request.
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        app_secret: str,
+        refresh_margin: float = 300.0,
+        session: requests.Session | None = None,
+        executor: Executor | None = None,
+    ):
+        """
+        Initialize token provider.
+
+        Args:
+            app_id: Feishu app ID.
+            app_secret: Feishu app secret.
+            refresh_margin: Seconds before expiry at which a background refresh starts.
+            session: HTTP session used for token requests (default: plain requests).
+            executor: Executor running the blocking request (default: loop default executor).
+        """
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.refresh_margin = refresh_margin
+        self.session = session
+        self.executor = executor
+
+        self._token: str | None = None
+        self._expires_at = 0.0  # time.monotonic() 时间
+        self._refresh_task: asyncio.Task | None = None
+
+        self.hits = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    def _fetch_sync(self) -> tuple[str, float]:
+        """Request a new token (blocking); returns (token, expire seconds)."""
+        response = (self.session or requests).post(
+            f"{FEISHU_API_BASE}/auth/v3/tenant_access_token/internal",
+            json={"app_id": self.app_id, "app_secret": self.app_secret},
+            timeout=10,
+        )
+        response.raise_for_status()
+        data = response.json()
+        token = data.get("tenant_access_token")
+        if data.get("code") != 0 or not token:
+            raise RuntimeError(f"code={data.get('code')}, msg={data.get('msg')}")
+        return token, float(data.get("expire", 7200))
+
+    async def _refresh(self) -> str:
+        """Fetch a new token and cache it."""
+        loop = asyncio.get_running_loop()
+        try:
+            token, expire = await loop.run_in_executor(self.executor, self._fetch_sync)
+        except Exception as e:
+            self.failures += 1
+            raise RuntimeError(f"Failed to get tenant access token: {e}") from e
+        self._token = token
+        self._expires_at = time.monotonic() + expire
+        self.refreshes += 1
+        return token
+
+    def _start_refresh(self) -> asyncio.Task:
+        """Start a refresh unless one is already running (coalesces concurrent callers)."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+            # 后台刷新失败时不抛出"未取回的异常"警告，下次 get 会重试
+            self._refresh_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return self._refresh_task
+
+    async def get(self) -> str:
+        """Get a valid tenant access token."""
+        remaining = self._expires_at - time.monotonic()
+        if self._token and remaining > self.refresh_margin:
+            self.hits += 1
+            return self._token
+        if self._token and remaining > 30:
+            # 即将过期：继续使用当前 token，同时在后台刷新
+            self.hits += 1
+            self._start_refresh()
+            return self._token
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self) -> None:
+        """Drop the cached token (e.g. after the API rejected it)."""
+        self._token = None
+        self._expires_at = 0.0
+
+    def get_stats(self) -> dict:
+        """Get token cache metrics."""
+        return {
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "expires_in": max(round(self._expires_at - time.monotonic()), 0) if self._token else 0,
+        }
+
 
 class FeishuChannel(BaseChannel):
     """
@@ -60,6 +182,32 @@ class FeishuChannel(BaseChannel):
         self._ws_thread: threading.Thread | None = None
         self._processed_message_ids: OrderedDict[str, None] = OrderedDict()  # Ordered dedup cache
         self._loop: asyncio.AbstractEventLoop | None = None
+        self._background_tasks: set[asyncio.Task] = set()  # 不等待的后台任务，保留引用防止被回收
+
+        # 发送专用线程池和长连接池：SDK 调用和上传都不阻塞事件循环，也不占用默认线程池
+        self.send_workers = int(os.getenv("FEISHU_SEND_WORKERS", "4"))
+        self.upload_timeout = float(os.getenv("FEISHU_UPLOAD_TIMEOUT", "120"))
+        self._executor = ThreadPoolExecutor(max_workers=self.send_workers, thread_name_prefix="feishu-send")
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.send_workers)
+        self._http.mount("https://", adapter)
+
+        # 所有上传和消息接口共享同一个缓存的 tenant token
+        self._tokens = TenantTokenProvider(
+            config.app_id, config.app_secret, session=self._http, executor=self._executor
+        )
+
+        # 客户端限流：应用级和单聊天级令牌桶；频控、token 失效和网络错误按指数退避加抖动重试
+        self._limiter = RateLimiter(
+            float(os.getenv("FEISHU_RATE_LIMIT", "50")),
+            float(os.getenv("FEISHU_CHAT_RATE_LIMIT", "5")),
+        )
+        self.max_retries = int(os.getenv("FEISHU_MAX_RETRIES", "5"))
+        self.retry_base_delay = 0.5
+        self.retry_max_delay = 30.0
+        self._retrying = 0  # 当前处于退避等待中的调用数
+        self._retries = 0
+        self._gave_up = 0
 
     async def start(self) -> None:
         """Start the Feishu bot with WebSocket long connection."""
@@ -75,9 +223,11 @@ class FeishuChannel(BaseChannel):
         self._loop = asyncio.get_running_loop()
 
         # Create Lark client for sending messages
+        # enable_set_token: SDK 调用使用 _request_option 传入的共享 token（未传入时 SDK 自行获取）
         self._client = lark.Client.builder() \
             .app_id(self.config.app_id) \
             .app_secret(self.config.app_secret) \
+            .enable_set_token(True) \
             .log_level(lark.LogLevel.INFO) \
             .build()
 
@@ -103,7 +253,6 @@ class FeishuChannel(BaseChannel):
                 print("📡 正在建立飞书 WebSocket 长连接...")
 
                 # Fix SSL certificate issue on macOS
-                import os
                 import certifi
                 os.environ['SSL_CERT_FILE'] = certifi.where()
                 os.environ['SSL_CERT_DIR'] = certifi.where()
@@ -131,9 +280,86 @@ class FeishuChannel(BaseChannel):
                 self._ws_client.stop()
             except Exception as e:
                 print(f"⚠️  Error stopping WebSocket client: {e}")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._http.close()
         print("✅ Feishu bot stopped")
 
-    def _add_reaction_sync(self, message_id: str, emoji_type: str) -> None:
+    async def _request_option(self) -> Any:
+        """Build SDK request options carrying the shared tenant token."""
+        builder = lark.RequestOption.builder()
+        try:
+            builder = builder.tenant_access_token(await self._tokens.get())
+        except Exception as e:
+            print(f"⚠️  {e}")
+        return builder.build()
+
+    def _check_token_error(self, code: Any) -> None:
+        """Drop the cached token if the API rejected it."""
+        if code in TOKEN_INVALID_CODES:
+            self._tokens.invalidate()
+
+    @staticmethod
+    def _is_retryable_error(error: Exception) -> bool:
+        """Network failures, HTTP 429 and 5xx are retried; other exceptions are not."""
+        if isinstance(error, requests.HTTPError):
+            status = error.response.status_code if error.response is not None else 0
+            return status == 429 or status >= 500
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    async def _call_api(self, chat_id: str | None, call, *args) -> Any:
+        """
+        Run one Feishu API call behind the rate limiters.
+
+        Rate-limited, token-rejected and network failures are retried up to
+        max_retries times with exponential backoff and full jitter. Returns
+        the last response (an SDK response or an upload dict); exceptions
+        that are not retryable, or still failing after the last attempt, are raised.
+        """
+        attempt = 0
+        while True:
+            await self._limiter.acquire(chat_id)
+            try:
+                result = await call(*args)
+            except Exception as e:
+                if not self._is_retryable_error(e):
+                    raise
+                if attempt >= self.max_retries:
+                    self._gave_up += 1
+                    raise
+                reason = str(e)
+            else:
+                code = result.get("code") if isinstance(result, dict) else result.code
+                if code == 0:
+                    return result
+                self._check_token_error(code)
+                if code not in RETRYABLE_CODES and code not in TOKEN_INVALID_CODES:
+                    return result
+                if attempt >= self.max_retries:
+                    self._gave_up += 1
+                    return result
+                reason = f"code={code}"
+
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+            attempt += 1
+            self._retries += 1
+            print(f"⚠️  Feishu API call failed ({reason}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            self._retrying += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._retrying -= 1
+
+    def get_send_stats(self) -> dict[str, Any]:
+        """Get rate limiting, retry and token cache metrics."""
+        return {
+            "rate_limit": self._limiter.get_stats(),
+            "retrying": self._retrying,
+            "retries": self._retries,
+            "gave_up": self._gave_up,
+            "token": self._tokens.get_stats(),
+        }
+
+    def _add_reaction_sync(self, message_id: str, emoji_type: str, option: Any) -> None:
         """Sync helper for adding reaction (runs in thread pool)."""
         try:
             request = CreateMessageReactionRequest.builder() \
@@ -144,7 +370,7 @@ class FeishuChannel(BaseChannel):
                     .build()
                 ).build()
 
-            response = self._client.im.v1.message_reaction.create(request)
+            response = self._client.im.v1.message_reaction.create(request, option)
 
             if not response.success():
                 print(f"⚠️  Failed to add reaction: code={response.code}, msg={response.msg}")
@@ -162,244 +388,200 @@ class FeishuChannel(BaseChannel):
         if not self._client or not Emoji:
             return
 
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, self._add_reaction_sync, message_id, emoji_type)
+        # 表情回复只是提示，限流但不重试
+        await self._limiter.acquire()
+        option = await self._request_option()
+        await self._run_blocking(self._add_reaction_sync, message_id, emoji_type, option)
 
     async def send(self, msg: OutboundMessage) -> None:
-        """Send a message through Feishu."""
-        if not self._client:
-            print("⚠️  Feishu client not initialized")
-            return
-
-        try:
-            # Determine receive_id_type based on chat_id format
-            # open_id starts with "ou_", chat_id starts with "oc_"
-            if msg.chat_id.startswith("oc_"):
-                receive_id_type = "chat_id"
-            else:
-                receive_id_type = "open_id"
-
-            # Check if content is a file path
-            import os
+        """
+        Send a message through Feishu (all blocking I/O runs on the send executor).
 
-            # 展开路径并检查是否为文件
-            expanded_content = os.path.expanduser(msg.content)
+        Raises RuntimeError when the message could not be delivered (after
+        retries), so the channel manager can count and log the failure.
+        """
+        if not self._client:
+            raise RuntimeError("Feishu client not initialized")
 
-            if os.path.isfile(expanded_content):
-                # Send file directly
-                await self._send_file(msg.chat_id, expanded_content, receive_id_type)
-            else:
-                # Send text message
-                content = json.dumps({"text": msg.content})
-
-                request = CreateMessageRequest.builder() \
-                    .receive_id_type(receive_id_type) \
-                    .request_body(
-                        CreateMessageRequestBody.builder()
-                        .receive_id(msg.chat_id)
-                        .msg_type("text")
-                        .content(content)
-                        .build()
-                    ).build()
-
-                response = self._client.im.v1.message.create(request)
-
-                if not response.success():
-                    print(
-                        f"❌ Failed to send Feishu message: code={response.code}, "
-                        f"msg={response.msg}, log_id={response.get_log_id()}"
-                    )
-                else:
-                    print(f"✅ Feishu message sent to {msg.chat_id}")
+        # Determine receive_id_type based on chat_id format
+        # open_id starts with "ou_", chat_id starts with "oc_"
+        if msg.chat_id.startswith("oc_"):
+            receive_id_type = "chat_id"
+        else:
+            receive_id_type = "open_id"
 
-        except Exception as e:
-            print(f"❌ Error sending Feishu message: {e}")
+        # 展开路径并检查是否为文件
+        expanded_content = os.path.expanduser(msg.content)
 
-    async def _send_file(self, chat_id: str, file_path: str, receive_id_type: str) -> None:
-        """Send a file through Feishu."""
-        try:
-            import os
-            from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody
-
-            if not os.path.isfile(file_path):
-                print(f"❌ File not found: {file_path}")
-                return
+        if os.path.isfile(expanded_content):
+            # Send file directly
+            await self._send_file(msg.chat_id, expanded_content, receive_id_type)
+            return
 
-            file_size = os.path.getsize(file_path)
-            file_name = os.path.basename(file_path)
+        # Send text message
+        content = json.dumps({"text": msg.content})
+        response = await self._call_api(
+            msg.chat_id, self._create_message, msg.chat_id, receive_id_type, "text", content, uuid.uuid4().hex
+        )
 
-            # Determine file type from extension
-            file_ext = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if not response.success():
+            raise RuntimeError(
+                f"Failed to send Feishu message: code={response.code}, "
+                f"msg={response.msg}, log_id={response.get_log_id()}"
+            )
+        print(f"✅ Feishu message sent to {msg.chat_id}")
 
-            # Check if it's an image
-            image_extensions = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp'}
-            if file_ext in image_extensions:
-                await self._send_image(chat_id, file_path, receive_id_type)
-                return
+    async def _run_blocking(self, func, *args) -> Any:
+        """Run a blocking call on the send executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
 
-            # Map file extensions to Feishu file types
-            file_type_map = {
-                'opus': 'opus',
-                'mp4': 'mp4',
-                'pdf': 'pdf',
-                'doc': 'doc',
-                'docx': 'doc',
-                'xls': 'xls',
-                'xlsx': 'xls',
-            }
-
-            file_type = file_type_map.get(file_ext, 'stream')
-
-            print(f"📤 Uploading file: {file_name} ({file_size} bytes)...")
-
-            # Upload file using multipart form data
-            import requests
-
-            # Get tenant access token
-            auth_url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-            auth_data = {
-                "app_id": self.config.app_id,
-                "app_secret": self.config.app_secret
-            }
-            auth_response = requests.post(auth_url, json=auth_data, timeout=10)
-
-            if not auth_response.ok:
-                print(f"❌ Failed to get access token: {auth_response.text}")
-                return
+    async def _create_message(
+        self, receive_id: str, receive_id_type: str, msg_type: str, content: str, dedup_id: str | None = None
+    ) -> Any:
+        """
+        Create a message via the SDK without blocking the event loop.
 
-            access_token = auth_response.json().get("tenant_access_token")
-            if not access_token:
-                print(f"❌ Access token is empty")
-                return
+        dedup_id is sent as the request uuid, so a retry of a request that
+        actually reached Feishu does not post the message twice.
+        """
+        body = CreateMessageRequestBody.builder() \
+            .receive_id(receive_id) \
+            .msg_type(msg_type) \
+            .content(content)
+        if dedup_id:
+            body = body.uuid(dedup_id)
+        request = CreateMessageRequest.builder() \
+            .receive_id_type(receive_id_type) \
+            .request_body(body.build()) \
+            .build()
 
-            # Upload file
-            upload_url = "https://open.feishu.cn/open-apis/im/v1/files"
-            headers = {
-                "Authorization": f"Bearer {access_token}"
-            }
-
-            with open(file_path, 'rb') as f:
-                files = {
-                    'file': (file_name, f, 'application/octet-stream'),
-                    'file_type': (None, file_type),
-                    'file_name': (None, file_name)
-                }
-                upload_response = requests.post(upload_url, headers=headers, files=files, timeout=30)
+        option = await self._request_option()
+        return await self._run_blocking(self._client.im.v1.message.create, request, option)
 
-            if not upload_response.ok:
-                print(f"❌ Failed to upload file: {upload_response.text}")
-                return
+    def _upload_sync(self, url: str, headers: dict[str, str], file_field: str, file_path: str, fields: dict[str, str]) -> dict:
+        """Upload a file as multipart form data over the pooled session (blocking)."""
+        file_name = os.path.basename(file_path)
+        with open(file_path, 'rb') as f:
+            files = {file_field: (file_name, f, 'application/octet-stream')}
+            files.update({key: (None, value) for key, value in fields.items()})
+            response = self._http.post(url, headers=headers, files=files, timeout=self.upload_timeout)
 
-            upload_data = upload_response.json()
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        # 频控等业务错误以 HTTP 4xx 加 JSON 错误码返回，交给调用方按错误码处理
+        if isinstance(data, dict) and "code" in data:
+            return data
+        response.raise_for_status()
+        raise RuntimeError(response.text)
+
+    async def _upload(self, url: str, file_field: str, file_path: str, fields: dict[str, str]) -> dict:
+        """Upload a file with the shared tenant token (fetched per attempt, so retries pick up a fresh one)."""
+        headers = {"Authorization": f"Bearer {await self._tokens.get()}"}
+        return await self._run_blocking(self._upload_sync, url, headers, file_field, file_path, fields)
 
-            if upload_data.get("code") != 0:
-                print(f"❌ Upload error: {upload_data.get('msg')}")
-                return
+    async def _send_file(self, chat_id: str, file_path: str, receive_id_type: str) -> None:
+        """Send a file through Feishu (raises RuntimeError on failure)."""
+        if not os.path.isfile(file_path):
+            raise RuntimeError(f"File not found: {file_path}")
 
-            file_key = upload_data.get("data", {}).get("file_key")
-            if not file_key:
-                print(f"❌ File key is empty")
-                return
+        file_size = os.path.getsize(file_path)
+        file_name = os.path.basename(file_path)
 
-            # Send file message
-            content = json.dumps({"file_key": file_key})
+        # Determine file type from extension
+        file_ext = os.path.splitext(file_name)[1].lower().lstrip('.')
 
-            request = CreateMessageRequest.builder() \
-                .receive_id_type(receive_id_type) \
-                .request_body(
-                    CreateMessageRequestBody.builder()
-                    .receive_id(chat_id)
-                    .msg_type("file")
-                    .content(content)
-                    .build()
-                ).build()
+        # Check if it's an image
+        image_extensions = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp'}
+        if file_ext in image_extensions:
+            await self._send_image(chat_id, file_path, receive_id_type)
+            return
 
-            response = self._client.im.v1.message.create(request)
+        # Map file extensions to Feishu file types
+        file_type_map = {
+            'opus': 'opus',
+            'mp4': 'mp4',
+            'pdf': 'pdf',
+            'doc': 'doc',
+            'docx': 'doc',
+            'xls': 'xls',
+            'xlsx': 'xls',
+        }
 
-            if not response.success():
-                print(f"❌ Failed to send file message: {response.msg}")
-            else:
-                print(f"✅ File sent to {chat_id}: {file_name}")
+        file_type = file_type_map.get(file_ext, 'stream')
 
-        except Exception as e:
-            print(f"❌ Error sending file: {e}")
+        print(f"📤 Uploading file: {file_name} ({file_size} bytes)...")
 
-    async def _send_image(self, chat_id: str, image_path: str, receive_id_type: str) -> None:
-        """Send an image through Feishu."""
+        # Upload file (multipart form data, on the send executor)
         try:
-            import os
-            import requests
-            from lark_oapi.api.im.v1 import CreateMessageRequest, CreateMessageRequestBody
-
-            if not os.path.isfile(image_path):
-                print(f"❌ Image not found: {image_path}")
-                return
-
-            file_size = os.path.getsize(image_path)
-            file_name = os.path.basename(image_path)
+            upload_data = await self._call_api(
+                None,
+                self._upload,
+                f"{FEISHU_API_BASE}/im/v1/files",
+                "file",
+                file_path,
+                {"file_type": file_type, "file_name": file_name},
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to upload file: {e}") from e
 
-            print(f"🖼️  Uploading image: {file_name} ({file_size} bytes)...")
+        if upload_data.get("code") != 0:
+            raise RuntimeError(f"Upload error: {upload_data.get('msg')}")
 
-            # Get tenant access token
-            auth_url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
-            auth_data = {
-                "app_id": self.config.app_id,
-                "app_secret": self.config.app_secret
-            }
-            auth_response = requests.post(auth_url, json=auth_data)
-            if not auth_response.ok:
-                print(f"❌ Failed to get access token: {auth_response.text}")
-                return
+        file_key = upload_data.get("data", {}).get("file_key")
+        if not file_key:
+            raise RuntimeError("File key is empty")
 
-            access_token = auth_response.json().get("tenant_access_token")
-
-            # Upload image
-            upload_url = "https://open.feishu.cn/open-apis/im/v1/images"
-            headers = {
-                "Authorization": f"Bearer {access_token}"
-            }
+        # Send file message
+        content = json.dumps({"file_key": file_key})
+        response = await self._call_api(
+            chat_id, self._create_message, chat_id, receive_id_type, "file", content, uuid.uuid4().hex
+        )
 
-            with open(image_path, 'rb') as f:
-                files = {
-                    'image': (file_name, f, 'application/octet-stream'),
-                    'image_type': (None, 'message')
-                }
-                upload_response = requests.post(upload_url, headers=headers, files=files)
+        if not response.success():
+            raise RuntimeError(f"Failed to send file message: {response.msg}")
+        print(f"✅ File sent to {chat_id}: {file_name}")
 
-            if not upload_response.ok:
-                print(f"❌ Failed to upload image: {upload_response.text}")
-                return
+    async def _send_image(self, chat_id: str, image_path: str, receive_id_type: str) -> None:
+        """Send an image through Feishu (raises RuntimeError on failure)."""
+        if not os.path.isfile(image_path):
+            raise RuntimeError(f"Image not found: {image_path}")
 
-            upload_data = upload_response.json()
-            if upload_data.get("code") != 0:
-                print(f"❌ Upload error: {upload_data.get('msg')}")
-                return
+        file_size = os.path.getsize(image_path)
+        file_name = os.path.basename(image_path)
 
-            image_key = upload_data.get("data", {}).get("image_key")
-            print(f"✅ Image uploaded! Key: {image_key}")
+        print(f"🖼️  Uploading image: {file_name} ({file_size} bytes)...")
 
-            # Send image message
-            content = json.dumps({"image_key": image_key})
+        # Upload image (on the send executor)
+        try:
+            upload_data = await self._call_api(
+                None,
+                self._upload,
+                f"{FEISHU_API_BASE}/im/v1/images",
+                "image",
+                image_path,
+                {"image_type": "message"},
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to upload image: {e}") from e
 
-            request = CreateMessageRequest.builder() \
-                .receive_id_type(receive_id_type) \
-                .request_body(
-                    CreateMessageRequestBody.builder()
-                    .receive_id(chat_id)
-                    .msg_type("image")
-                    .content(content)
-                    .build()
-                ).build()
+        if upload_data.get("code") != 0:
+            raise RuntimeError(f"Upload error: {upload_data.get('msg')}")
 
-            response = self._client.im.v1.message.create(request)
+        image_key = upload_data.get("data", {}).get("image_key")
+        print(f"✅ Image uploaded! Key: {image_key}")
 
-            if not response.success():
-                print(f"❌ Failed to send image message: {response.msg}")
-            else:
-                print(f"✅ Image sent to {chat_id}: {file_name}")
+        # Send image message
+        content = json.dumps({"image_key": image_key})
+        response = await self._call_api(
+            chat_id, self._create_message, chat_id, receive_id_type, "image", content, uuid.uuid4().hex
+        )
 
-        except Exception as e:
-            print(f"❌ Error sending image: {e}")
+        if not response.success():
+            raise RuntimeError(f"Failed to send image message: {response.msg}")
+        print(f"✅ Image sent to {chat_id}: {file_name}")
 
     def _on_message_sync(self, data: "P2ImMessageReceiveV1") -> None:
         """
@@ -444,8 +626,10 @@ class FeishuChannel(BaseChannel):
             print(f"  聊天类型: {chat_type}")
             print(f"  消息类型: {msg_type}")
 
-            # Add reaction to indicate "seen"
-            await self._add_reaction(message_id, "THUMBSUP")
+            # Add reaction to indicate "seen"（不等待，避免延迟消息处理）
+            task = asyncio.ensure_future(self._add_reaction(message_id, "THUMBSUP"))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
 
             # Parse message content
             if msg_type == "text":
@@ -1,5 +1,6 @@
 """Channel manager for coordinating chat channels."""
 
+import os
 import asyncio
 from typing import Any
 
@@ -17,14 +18,29 @@ class ChannelManager:
     - Initialize enabled channels (Feishu, Telegram, etc.)
     - Start/stop channels
     - Route outbound messages
+
+    Outbound messages fan out into one lane per (channel, chat_id): a lane
+    sends its messages in order, lanes of different chats send in parallel,
+    and at most max_inflight sends run at the same time overall.
     """
 
-    def __init__(self, config: Config, bus: MessageBus):
+    def __init__(self, config: Config, bus: MessageBus, max_inflight: int | None = None, lane_idle_timeout: float = 60.0):
         self.config = config
         self.bus = bus
         self.channels: dict[str, BaseChannel] = {}
         self._dispatch_task: asyncio.Task | None = None
 
+        # 出站通道：每个聊天一个有序队列，全局限制同时发送的消息数
+        self.max_inflight = max_inflight or int(os.getenv("OUTBOUND_MAX_INFLIGHT", "8"))
+        self.lane_idle_timeout = lane_idle_timeout  # 队列空闲多久后回收该聊天的 worker
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        self._lanes: dict[tuple[str, str], asyncio.Queue] = {}
+        self._lane_tasks: dict[tuple[str, str], asyncio.Task] = {}
+        self._lane_peak: dict[tuple[str, str], int] = {}  # 每个通道出现过的最大排队数
+        self._sending = 0
+        self._sent = 0
+        self._failed = 0
+
         self._init_channels()
 
     def _init_channels(self) -> None:
@@ -64,13 +80,18 @@ class ChannelManager:
         """Stop all channels and the dispatcher."""
         print("🛑 Stopping all channels...")
 
-        # Stop dispatcher
-        if self._dispatch_task:
-            self._dispatch_task.cancel()
+        # Stop dispatcher and lane workers
+        tasks = [self._dispatch_task] if self._dispatch_task else []
+        tasks += list(self._lane_tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
             try:
-                await self._dispatch_task
+                await task
             except asyncio.CancelledError:
                 pass
+        self._lane_tasks.clear()
+        self._lanes.clear()
 
         # Stop all channels
         for name, channel in self.channels.items():
@@ -81,7 +102,7 @@ class ChannelManager:
                 print(f"❌ Error stopping {name}: {e}")
 
     async def _dispatch_outbound(self) -> None:
-        """Dispatch outbound messages to the appropriate channel."""
+        """Route outbound messages into per-chat lanes."""
         print("📤 Outbound dispatcher started")
 
         while True:
@@ -90,20 +111,101 @@ class ChannelManager:
                     self.bus.consume_outbound(), timeout=1.0
                 )
 
-                channel = self.channels.get(msg.channel)
-                if channel:
-                    try:
-                        await channel.send(msg)
-                    except Exception as e:
-                        print(f"❌ Error sending to {msg.channel}: {e}")
-                else:
+                if msg.channel not in self.channels:
                     print(f"⚠️  Unknown channel: {msg.channel}")
+                    continue
+
+                key = (msg.channel, msg.chat_id)
+                lane = self._lanes.get(key)
+                if lane is None:
+                    lane = self._lanes[key] = asyncio.Queue()
+                lane.put_nowait(msg)
+                self._lane_peak[key] = max(self._lane_peak.get(key, 0), lane.qsize())
+
+                if key not in self._lane_tasks:
+                    self._lane_tasks[key] = asyncio.create_task(self._run_lane(key, lane))
 
             except asyncio.TimeoutError:
                 continue
             except asyncio.CancelledError:
                 break
 
+    async def _run_lane(self, key: tuple[str, str], lane: asyncio.Queue) -> None:
+        """Send one chat's messages in order; exits once the lane stays idle."""
+        channel = self.channels[key[0]]
+        while True:
+            try:
+                msg = await asyncio.wait_for(lane.get(), timeout=self.lane_idle_timeout)
+            except asyncio.TimeoutError:
+                # 检查与移除之间没有 await，分发器不会在此期间写入该队列
+                if lane.empty():
+                    self._lanes.pop(key, None)
+                    self._lane_tasks.pop(key, None)
+                    self._lane_peak.pop(key, None)
+                    return
+                continue
+
+            async with self._inflight:
+                self._sending += 1
+                try:
+                    await channel.send(msg)
+                    self._sent += 1
+                except Exception as e:
+                    self._failed += 1
+                    print(f"❌ Error sending to {msg.channel}: {e}")
+                finally:
+                    self._sending -= 1
+
+    def get_outbound_stats(self) -> dict[str, Any]:
+        """Get outbound dispatch metrics (lane queue depth, in-flight sends, coalescing and per-channel send stats)."""
+        return {
+            "inflight": self._sending,
+            "max_inflight": self.max_inflight,
+            "sent": self._sent,
+            "failed": self._failed,
+            "pending": self.bus.outbound_qsize(),
+            "coalesce": self.bus.get_coalesce_stats(),
+            "channels": {name: channel.get_send_stats() for name, channel in self.channels.items()},
+            "lanes": {
+                f"{channel}:{chat_id}": {"depth": lane.qsize(), "peak": self._lane_peak.get((channel, chat_id), 0)}
+                for (channel, chat_id), lane in self._lanes.items()
+            },
+        }
+
+    def format_outbound_stats(self) -> str:
+        """Human-readable summary of get_outbound_stats() (for logs and the /status command)."""
+        stats = self.get_outbound_stats()
+        lines = [
+            f"📊 出站消息: 已发送 {stats['sent']}，失败 {stats['failed']}，"
+            f"发送中 {stats['inflight']}/{stats['max_inflight']}，待分发 {stats['pending']}，"
+            f"合并 {stats['coalesce']['merged']} 条"
+        ]
+        if stats["lanes"]:
+            deepest, lane = max(stats["lanes"].items(), key=lambda item: item[1]["depth"])
+            lines.append(f"  聊天队列 {len(stats['lanes'])} 个，最长 {deepest}: {lane['depth']}（峰值 {lane['peak']}）")
+        for name, send_stats in stats["channels"].items():
+            limit = send_stats.get("rate_limit")
+            if not limit:
+                continue
+            lines.append(
+                f"  {name}: 限流等待中 {limit['waiting']}，累计限流 {limit['throttled']} 次/{limit['wait_total']}s"
+                f"（最长 {limit['wait_max']}s），重试 {send_stats['retries']}，退避中 {send_stats['retrying']}，"
+                f"放弃 {send_stats['gave_up']}"
+            )
+        return "\n".join(lines)
+
+    async def report_outbound_loop(self, interval: float = 60.0) -> None:
+        """Periodically log outbound stats while there is outbound activity."""
+        last = None
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.get_outbound_stats()
+            # 没有新的发送、失败或排队时不重复打印
+            snapshot = (stats["sent"], stats["failed"], len(stats["lanes"]), stats["pending"])
+            if snapshot != last and (stats["sent"] or stats["failed"] or stats["lanes"]):
+                print(self.format_outbound_stats())
+            last = snapshot
+
     def get_channel(self, name: str) -> BaseChannel | None:
         """Get a channel by name."""
         return self.channels.get(name)
@@ -0,0 +1,118 @@
+"""Client-side token-bucket rate limiting for channel APIs."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second.
+
+    Callers reserve a token up front and are told how long to wait for it,
+    so waiters are served in arrival order without holding a lock.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        """
+        Initialize token bucket.
+
+        Args:
+            rate: Tokens added per second.
+            capacity: Maximum burst size (default: one second's worth, at least 1).
+        """
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take one token; returns the seconds to wait before using it."""
+        self._refill()
+        self._tokens -= 1
+        # 余额为负表示已预支，按欠额计算需要等待的时间
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    @property
+    def idle(self) -> bool:
+        """True when the bucket is full, i.e. dropping it loses no state."""
+        self._refill()
+        return self._tokens >= self.capacity
+
+
+class RateLimiter:
+    """
+    App-wide bucket plus one bucket per chat.
+
+    acquire(chat_id) waits until both the app bucket and that chat's bucket
+    allow one more call. Per-chat buckets are kept for the most recent
+    max_chats chats; idle ones beyond that are dropped.
+    """
+
+    def __init__(self, rate: float, chat_rate: float, max_chats: int = 1000):
+        """
+        Initialize rate limiter.
+
+        Args:
+            rate: App-wide calls per second (0 disables the app limit).
+            chat_rate: Calls per second to a single chat (0 disables the chat limit).
+            max_chats: Number of per-chat buckets to keep.
+        """
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.max_chats = max_chats
+        self._app = TokenBucket(rate) if rate > 0 else None
+        self._chats: OrderedDict[str, TokenBucket] = OrderedDict()
+
+        self.waiting = 0  # 当前因限流等待的调用数
+        self.throttled = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate)
+            # 只回收已满（空闲）的桶，正在限流的聊天不会丢失状态
+            for key in list(self._chats)[:len(self._chats) - self.max_chats]:
+                if self._chats[key].idle:
+                    del self._chats[key]
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: str | None = None) -> float:
+        """Wait for permission to make one call; returns the seconds spent throttled."""
+        wait = self._app.reserve() if self._app else 0.0
+        if chat_id and self.chat_rate > 0:
+            wait = max(wait, self._chat_bucket(chat_id).reserve())
+        if wait <= 0:
+            return 0.0
+
+        self.throttled += 1
+        self.waiting += 1
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+        return wait
+
+    def get_stats(self) -> dict[str, Any]:
+        """Get throttling metrics."""
+        return {
+            "rate": self.rate,
+            "chat_rate": self.chat_rate,
+            "waiting": self.waiting,
+            "throttled": self.throttled,
+            "wait_total": round(self.wait_total, 3),
+            "wait_max": round(self.wait_max, 3),
+            "chats": len(self._chats),
+        }
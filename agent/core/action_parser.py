@@ -0,0 +1,284 @@
+"""Single-pass, incremental extraction of the JSON action from an AI response"""
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+JSON_START_MARKER = "===== JSON START ====="
+
+# 字符串内部需要单独处理的字符：引号、反斜杠、控制字符
+STRING_SPECIAL = re.compile(r'["\\\x00-\x1f]')
+# 字符串外部需要处理的字符：结构符号和字符串起点
+STRUCTURE_SPECIAL = re.compile(r'[{}\[\]":,]')
+
+VALID_ESCAPES = set('"\\/bfnrtu')
+HEX_DIGITS = set("0123456789abcdefABCDEF")
+# 以盘符开头的字符串按 Windows 路径处理
+DRIVE_PREFIX = re.compile(r"[A-Za-z]:$")
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+class ActionExtractor:
+    """
+    Extract the first JSON object (the action) from a response, one chunk at a time
+
+    The text is scanned once, left to right, while a repaired copy of the
+    object is written out:
+    - Before the object, everything (prose, code fences) is skipped; if the
+      "===== JSON START =====" marker shows up, scanning starts after it.
+    - Inside strings, a quote only ends the string when what follows fits
+      the JSON grammar (":" after a key, "," / "}" / "]" after a value);
+      any other quote is an unescaped quote in the text and gets escaped.
+      Raw newlines and invalid backslash escapes (such as the \\d in a
+      regex) are escaped as well; later escapes in the string still decode.
+      A string that starts with a drive letter is a Windows path: every
+      backslash in it except \\\\ and \\" is taken literally, so "C:\\new"
+      keeps its "\\n".
+    - Trailing commas are dropped. A response cut off before the object
+      closes yields no action: finish() returns None and sets truncated,
+      so a half-written file_write or shell command is never run.
+
+    feed() returns the action as soon as its closing brace arrives, so the
+    extractor can consume a streamed response; end is the offset just past
+    the object in the text fed so far.
+    """
+
+    def __init__(self, marker: str = JSON_START_MARKER):
+        self.marker = marker
+        self.action: Optional[Dict[str, Any]] = None
+        self.end: Optional[int] = None
+        self.done = False
+        self.truncated = False
+
+        self._chunks: List[str] = []  # 全部输入，仅在没有 JSON 标记时用于重新扫描
+        self._buf = ""  # 尚未处理完的尾部文本
+        self._offset = 0  # _buf[0] 在全部输入中的位置
+        self._pos = 0  # 下一个待处理字符在 _buf 中的位置
+        self._marker_found = False
+        self._reset_object()
+
+    def _reset_object(self) -> None:
+        """Forget any partially scanned object"""
+        self._out: List[str] = []
+        self._stack: List[str] = []  # "{" 或 "["
+        self._expect_key = False  # 当前对象中下一个字符串是否为键
+        self._in_string = False
+        self._string_is_key = False
+        self._string_start = 0  # 当前字符串内容在 _out 中的起始位置
+        self._string_checked = False  # 是否已检查过盘符前缀
+        self._literal_backslashes = False  # 当前字符串是否按 Windows 路径处理反斜杠
+        self._started = False
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        """Consume more text; returns the action once it is complete"""
+        if not self.done:
+            self._chunks.append(chunk)
+            self._buf += chunk
+            self._scan(final=False)
+            # 丢弃已处理的部分，避免每次 feed 都复制全部文本
+            self._offset += self._pos
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        return self.action
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """Signal the end of the text and return the action (None if there is none)"""
+        if self.done:
+            return self.action
+
+        if not self._marker_found:
+            # 没有 JSON 标记：从第一个 "{" 开始重新扫描整段文本
+            self._marker_found = True
+            self._buf = "".join(self._chunks)
+            self._offset = 0
+            self._pos = 0
+            self._reset_object()
+        self._scan(final=True)
+
+        if not self.done and self._started:
+            # 响应在对象中途被截断（如超过 MAX_TOKENS）：补全后执行会写出残缺内容，不返回动作
+            self.truncated = True
+        self._chunks = []
+        self.done = True
+        return self.action
+
+    def _scan(self, final: bool) -> None:
+        """Advance over the buffered text as far as it can be decided"""
+        buf = self._buf
+        if not self._marker_found:
+            idx = buf.find(self.marker, self._pos)
+            if idx < 0:
+                # 标记可能跨越两次 feed，保留末尾可能是标记开头的部分
+                self._pos = max(len(buf) - len(self.marker) + 1, self._pos)
+                return
+            self._marker_found = True
+            self._pos = idx + len(self.marker)
+
+        while not self.done:
+            if not self._started:
+                start = buf.find("{", self._pos)
+                if start < 0:
+                    self._pos = len(buf)
+                    return
+                self._started = True
+                self._stack.append("{")
+                self._expect_key = True
+                self._out.append("{")
+                self._pos = start + 1
+            elif self._in_string:
+                if not self._scan_string(final):
+                    return
+            else:
+                match = STRUCTURE_SPECIAL.search(buf, self._pos)
+                if match is None:
+                    self._out.append(buf[self._pos:])
+                    self._pos = len(buf)
+                    return
+                index = match.start()
+                self._out.append(buf[self._pos:index])
+                self._pos = index + 1
+                self._structure(buf[index])
+
+    def _structure(self, char: str) -> None:
+        """Handle one structural character outside strings"""
+        if char == '"':
+            self._in_string = True
+            self._string_is_key = self._stack[-1] == "{" and self._expect_key
+            self._out.append('"')
+            self._string_start = len(self._out)
+            self._string_checked = False
+            self._literal_backslashes = False
+        elif char in "{[":
+            self._stack.append(char)
+            self._expect_key = char == "{"
+            self._out.append(char)
+        elif char in "}]":
+            self._close(self._stack.pop())
+            if not self._stack:
+                self._complete(self._offset + self._pos)
+        elif char == ":":
+            self._expect_key = False
+            self._out.append(char)
+        else:  # ","
+            self._expect_key = self._stack[-1] == "{"
+            self._out.append(char)
+
+    def _close(self, opener: str) -> None:
+        """Write the closing bracket for opener, dropping a trailing comma"""
+        while self._out and not self._out[-1].strip():
+            self._out.pop()
+        if self._out and self._out[-1] == ",":
+            self._out.pop()
+        self._out.append("}" if opener == "{" else "]")
+        self._expect_key = False
+
+    def _scan_string(self, final: bool) -> bool:
+        """Advance inside a string; returns False when more text is needed"""
+        buf = self._buf
+        while True:
+            match = STRING_SPECIAL.search(buf, self._pos)
+            if match is None:
+                self._out.append(buf[self._pos:])
+                self._pos = len(buf)
+                return False
+
+            index = match.start()
+            self._out.append(buf[self._pos:index])
+            char = buf[index]
+
+            if char == "\\":
+                if index + 1 >= len(buf):
+                    if not final:
+                        self._pos = index
+                        return False
+                    self._out.append("\\\\")
+                    self._pos = index + 1
+                    continue
+                if not self._string_checked:
+                    self._string_checked = True
+                    if DRIVE_PREFIX.match("".join(self._out[self._string_start:])):
+                        self._literal_backslashes = True
+                escaped = buf[index + 1]
+                if escaped == "u" and not self._literal_backslashes:
+                    digits = buf[index + 2:index + 6]
+                    if len(digits) < 4 and not final:
+                        self._pos = index
+                        return False
+                    valid = len(digits) == 4 and set(digits) <= HEX_DIGITS
+                else:
+                    valid = escaped in VALID_ESCAPES and (not self._literal_backslashes or escaped in '"\\')
+                if valid:
+                    self._out.append("\\" + escaped)
+                else:
+                    # 非法转义（如正则中的 \d）只把这一个反斜杠按字面处理，后续转义照常解码
+                    self._out.append("\\\\")
+                    self._pos = index + 1
+                    continue
+                self._pos = index + 2
+            elif char == '"':
+                closes = self._quote_closes(index, final)
+                if closes is None:
+                    self._pos = index
+                    return False
+                self._pos = index + 1
+                if closes:
+                    self._out.append('"')
+                    self._in_string = False
+                    return True
+                self._out.append('\\"')
+            else:
+                self._out.append(CONTROL_ESCAPES.get(char, f"\\u{ord(char):04x}"))
+                self._pos = index + 1
+
+    def _next_significant(self, index: int) -> Optional[int]:
+        """Index of the first non-whitespace character after index (None if not buffered yet)"""
+        buf = self._buf
+        index += 1
+        while index < len(buf) and buf[index].isspace():
+            index += 1
+        return index if index < len(buf) else None
+
+    def _quote_closes(self, index: int, final: bool) -> Optional[bool]:
+        """Decide whether the quote at index ends the current string (None = need more text)"""
+        nxt = self._next_significant(index)
+        if nxt is None:
+            return True if final else None
+        char = self._buf[nxt]
+
+        if self._string_is_key:
+            return char == ":"
+        if char == ",":
+            if self._stack[-1] == "[":
+                return True
+            after = self._next_significant(nxt)
+            if after is None:
+                return True if final else None
+            # 下一个键，或多余的结尾逗号
+            return self._buf[after] in '"}'
+        if char in "}]":
+            if char != ("}" if self._stack[-1] == "{" else "]"):
+                return False
+            after = self._next_significant(nxt)
+            if after is None:
+                return True if final else None
+            if len(self._stack) > 1:
+                return self._buf[after] in ",}]"
+            # 根对象结束：后面应是 JSON 结束标记、代码块结尾或另起一行的内容
+            return self._buf[after] in "=`" or "\n" in self._buf[nxt:after]
+        return False
+
+    def _complete(self, end: int) -> None:
+        """Decode the repaired object (end is an offset in the whole input)"""
+        self.done = True
+        self.end = end
+        try:
+            action = json.loads("".join(self._out))
+        except json.JSONDecodeError:
+            action = None
+        self.action = action if isinstance(action, dict) else None
+
+
+def extract_action(text: str, marker: str = JSON_START_MARKER) -> Optional[Dict[str, Any]]:
+    """Extract the JSON action from a complete response"""
+    extractor = ActionExtractor(marker)
+    extractor.feed(text)
+    return extractor.finish()
@@ -1,13 +1,22 @@
 """AI Agent Core Engine"""
 import os
 import json
+import importlib.util
+import threading
+import httpx
 import requests
-from typing import Optional, List, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, List, Dict, Any, Callable, Iterator, AsyncIterator, Union
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
+from agent.core.response_cache import ResponseCache, get_response_cache, make_cache_key
+
 load_dotenv()
 
+# 系统提示词：完整字符串，或按 [稳定前缀, 每步变化的后缀] 分段（便于服务端缓存前缀）
+SystemPrompt = Union[str, List[str]]
+
 
 @dataclass
 class Message:
@@ -25,12 +34,59 @@ class AIEngine:
         self.model = os.getenv("API_MODEL", "gpt-4")
         self.max_tokens = int(os.getenv("MAX_TOKENS", "4096"))
         self.temperature = float(os.getenv("TEMPERATURE", "0.7"))
+        self.timeout = float(os.getenv("API_TIMEOUT", "30"))
+        self.pool_size = int(os.getenv("API_POOL_SIZE", "10"))
+        self.stream_enabled = os.getenv("API_STREAM", "false").lower() == "true"
+        # json：动作以 JSON 文本嵌在回复中；native：使用接口原生的 tools / tool_calls
+        self.tool_mode = os.getenv("API_TOOL_MODE", "json").lower()
+        # 为分段系统提示词的稳定前缀加上 cache_control 标记（Claude 等需要显式标记的模型）
+        self.cache_control = os.getenv("API_CACHE_CONTROL", "false").lower() == "true"
+
+        # 最近一次调用的提示词用量（服务端返回 usage 时记录），以及累计值
+        self.last_usage: Optional[Dict[str, int]] = None
+        self.prompt_tokens_total = 0
+        self.cached_tokens_total = 0
 
         if not self.api_key:
             raise ValueError("API_KEY not found in environment variables")
 
         self.conversation_history: List[Message] = []
 
+        # 可选的响应缓存（LLM_CACHE=true 时启用），只用于标记为 cacheable 的调用
+        self.response_cache: Optional[ResponseCache] = get_response_cache()
+
+        # 长连接池：主循环和后台压缩线程共享同一个 Session，避免每步重新握手
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Get the shared keep-alive HTTP session (created lazily)"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size,
+                        pool_maxsize=self.pool_size,
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json",
+                        "Connection": "keep-alive",
+                    })
+                    self._session = session
+        return self._session
+
+    def close(self) -> None:
+        """Close the pooled HTTP session"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
     def add_message(self, role: str, content: str) -> None:
         """Add message to conversation history"""
         self.conversation_history.append(Message(role=role, content=content))
@@ -72,20 +128,60 @@ class AIEngine:
             for msg in self.conversation_history
         ]
 
-    def call_api(self, user_message: str, system_prompt: Optional[str] = None) -> str:
-        """Call AI API and get response"""
-        self.add_message("user", user_message)
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
+    def _system_message(self, system_prompt: SystemPrompt) -> Dict[str, Any]:
+        """Build the system message; segments before the last get a cache breakpoint"""
+        if isinstance(system_prompt, str):
+            return {"role": "system", "content": system_prompt}
+        if not self.cache_control:
+            # 不加标记时拼接为普通字符串，稳定前缀照样可被自动前缀缓存命中
+            return {"role": "system", "content": "".join(system_prompt)}
+
+        segments = [segment for segment in system_prompt if segment]
+        content = []
+        for index, segment in enumerate(segments):
+            part = {"type": "text", "text": segment}
+            if index < len(segments) - 1:
+                part["cache_control"] = {"type": "ephemeral"}
+            content.append(part)
+        return {"role": "system", "content": content}
+
+    def _record_usage(self, usage: Optional[Dict[str, Any]]) -> None:
+        """Record prompt and cached token counts from a response's usage block
+
+        Handles both the OpenAI shape (prompt_tokens_details.cached_tokens)
+        and the Anthropic shape (cache_read_input_tokens, input_tokens
+        excluding cached tokens).
+        """
+        if not usage:
+            return
+        if "prompt_tokens" in usage:
+            prompt_tokens = usage.get("prompt_tokens") or 0
+            cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") \
+                or usage.get("cache_read_input_tokens") or 0
+        else:
+            cached_tokens = usage.get("cache_read_input_tokens") or 0
+            prompt_tokens = (usage.get("input_tokens") or 0) + cached_tokens \
+                + (usage.get("cache_creation_input_tokens") or 0)
+        self.last_usage = {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens}
+        self.prompt_tokens_total += prompt_tokens
+        self.cached_tokens_total += cached_tokens
+
+    def get_usage_stats(self) -> dict:
+        """Get prompt token metrics, including the share served from the provider's prompt cache"""
+        return {
+            "prompt_tokens": self.prompt_tokens_total,
+            "cached_tokens": self.cached_tokens_total,
+            "cached_ratio": self.cached_tokens_total / self.prompt_tokens_total if self.prompt_tokens_total else 0.0,
+            "last_usage": self.last_usage,
         }
 
+    def _build_payload(self, system_prompt: Optional[SystemPrompt] = None, stream: bool = False) -> Dict[str, Any]:
+        """Build the chat completion payload from conversation history"""
         messages = self.get_history()
 
         # Add system prompt if provided
         if system_prompt:
-            messages.insert(0, {"role": "system", "content": system_prompt})
+            messages.insert(0, self._system_message(system_prompt))
 
         payload = {
             "model": self.model,
@@ -93,19 +189,148 @@ class AIEngine:
             "max_tokens": self.max_tokens,
             "temperature": self.temperature
         }
+        if stream:
+            payload["stream"] = True
+            # 让流式响应的最后一个分片带上 usage，用于统计提示词缓存命中
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _build_tools_payload(self, system_prompt: Optional[SystemPrompt], tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build a chat completion payload that offers function-calling tools"""
+        payload = self._build_payload(system_prompt)
+        payload["tools"] = tools
+        payload["tool_choice"] = "auto"
+        return payload
+
+    @staticmethod
+    def _parse_tool_calls(message: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract content and tool calls from a completion message
+
+        Returns {"content": str, "tool_calls": [{"tool": name, "params": {...}}]}.
+        Calls whose arguments are not valid JSON are passed with empty params
+        so the tool reports the missing parameter instead of failing silently.
+        """
+        tool_calls = []
+        for call in message.get("tool_calls") or []:
+            function = call.get("function") or {}
+            name = function.get("name")
+            if not name:
+                continue
+            arguments = function.get("arguments") or "{}"
+            if isinstance(arguments, str):
+                try:
+                    arguments = json.loads(arguments)
+                except json.JSONDecodeError:
+                    arguments = {}
+            if not isinstance(arguments, dict):
+                arguments = {}
+            tool_calls.append({"tool": name, "params": arguments})
+        return {"content": message.get("content") or "", "tool_calls": tool_calls}
+
+    @staticmethod
+    def _describe_tool_calls(result: Dict[str, Any]) -> str:
+        """Render a tool-calling reply as text for the conversation history"""
+        lines = [result["content"]] if result["content"] else []
+        for call in result["tool_calls"]:
+            lines.append(f"[tool_call] {call['tool']} {json.dumps(call['params'], ensure_ascii=False)}")
+        return "\n".join(lines)
+
+    def _cached_response(self, payload: Dict[str, Any], cacheable: bool) -> tuple:
+        """Look up a payload in the response cache
+
+        Returns (cache_key, cached_response); cache_key is None when the
+        call is not cacheable or the cache is disabled.
+        """
+        if not cacheable or self.response_cache is None:
+            return None, None
+        key = make_cache_key(self.api_base_url, payload)
+        return key, self.response_cache.get(key)
+
+    @staticmethod
+    def _parse_sse_chunk(line: str) -> Optional[Dict[str, Any]]:
+        """Parse one server-sent-event line into its JSON chunk
+
+        Returns None for keep-alive/comment lines and the [DONE] sentinel.
+        """
+        if not line or not line.startswith("data:"):
+            return None
+
+        data = line[len("data:"):].strip()
+        if not data or data == "[DONE]":
+            return None
+
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _chunk_delta(chunk: Dict[str, Any]) -> Optional[str]:
+        """Get the content delta of a streamed chunk"""
+        choices = chunk.get("choices") or []
+        if not choices:
+            return None
+        return (choices[0].get("delta") or {}).get("content") or None
+
+    @classmethod
+    def _parse_sse_line(cls, line: str) -> Optional[str]:
+        """Parse one server-sent-event line and return its content delta"""
+        chunk = cls._parse_sse_chunk(line)
+        return cls._chunk_delta(chunk) if chunk else None
+
+    def _read_sse_line(self, line: str) -> Optional[str]:
+        """Parse one server-sent-event line, recording usage if the chunk carries it"""
+        chunk = self._parse_sse_chunk(line)
+        if not chunk:
+            return None
+        self._record_usage(chunk.get("usage"))
+        return self._chunk_delta(chunk)
+
+    def call_api(
+        self,
+        user_message: str,
+        system_prompt: Optional[SystemPrompt] = None,
+        stream: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        cacheable: bool = False,
+    ) -> str:
+        """Call AI API and get response
+
+        With stream=True the completion is read as server-sent events and
+        on_delta is invoked for every content delta as it arrives.
+        cacheable marks the call as a pure function of its messages, so a
+        non-streaming response may be served from the response cache.
+        """
+        if stream:
+            parts = []
+            for delta in self.stream_api(user_message, system_prompt):
+                parts.append(delta)
+                if on_delta:
+                    on_delta(delta)
+            return "".join(parts)
+
+        self.add_message("user", user_message)
+        payload = self._build_payload(system_prompt)
+
+        cache_key, cached = self._cached_response(payload, cacheable)
+        if cached is not None:
+            self.add_message("assistant", cached)
+            return cached
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_base_url}/v1/chat/completions",
-                headers=headers,
                 json=payload,
-                timeout=30
+                timeout=self.timeout
             )
             response.raise_for_status()
 
             result = response.json()
+            self._record_usage(result.get("usage"))
             assistant_message = result["choices"][0]["message"]["content"]
             self.add_message("assistant", assistant_message)
+            if cache_key:
+                self.response_cache.put(cache_key, assistant_message)
 
             return assistant_message
 
@@ -114,14 +339,81 @@ class AIEngine:
             self.add_message("assistant", error_msg)
             return error_msg
 
-    def process_with_tools(self, user_message: str, available_tools: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Process message with tool availability information"""
+    def call_api_with_tools(
+        self,
+        user_message: str,
+        system_prompt: Optional[SystemPrompt],
+        tools: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Call AI API with native function calling
+
+        Returns {"content": str, "tool_calls": [{"tool": name, "params": {...}}]};
+        on failure content is "API Error: ..." and tool_calls is empty.
+        """
+        self.add_message("user", user_message)
+        payload = self._build_tools_payload(system_prompt, tools)
+
+        try:
+            response = self.session.post(
+                f"{self.api_base_url}/v1/chat/completions",
+                json=payload,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+
+            data = response.json()
+            self._record_usage(data.get("usage"))
+            result = self._parse_tool_calls(data["choices"][0]["message"])
+            self.add_message("assistant", self._describe_tool_calls(result))
+
+            return result
+
+        except requests.exceptions.RequestException as e:
+            error_msg = f"API Error: {str(e)}"
+            self.add_message("assistant", error_msg)
+            return {"content": error_msg, "tool_calls": []}
+
+    def stream_api(self, user_message: str, system_prompt: Optional[SystemPrompt] = None) -> Iterator[str]:
+        """Call AI API in streaming (SSE) mode and yield content deltas"""
+        self.add_message("user", user_message)
+        payload = self._build_payload(system_prompt, stream=True)
+
+        parts = []
+        try:
+            # timeout 作用于每次读取，长回复只要持续输出就不会整体超时
+            with self.session.post(
+                f"{self.api_base_url}/v1/chat/completions",
+                json=payload,
+                timeout=self.timeout,
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                # SSE 响应通常不带 charset，强制按 UTF-8 解码
+                response.encoding = "utf-8"
+
+                for line in response.iter_lines(decode_unicode=True):
+                    delta = self._read_sse_line(line)
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+
+        except requests.exceptions.RequestException as e:
+            error_msg = f"API Error: {str(e)}"
+            self.add_message("assistant", error_msg)
+            yield error_msg
+            return
+
+        self.add_message("assistant", "".join(parts))
+
+    @staticmethod
+    def _build_tools_prompt(available_tools: List[Dict[str, Any]]) -> str:
+        """Build the system prompt describing available tools"""
         tools_descriptions = "\n".join([
             f"- {tool['name']}: {tool['description']}\n  Parameters: {tool['params']}"
             for tool in available_tools
         ])
 
-        system_prompt = f"""You are an AI assistant with access to system tools. You can execute commands and perform actions.
+        return f"""You are an AI assistant with access to system tools. You can execute commands and perform actions.
 
 Available tools:
 {tools_descriptions}
@@ -132,8 +424,9 @@ When you need to use a tool, respond ONLY with a JSON object in this exact forma
 If the user asks a question that doesn't require tools, respond normally.
 If you need to use multiple tools, respond with one tool call at a time."""
 
-        response = self.call_api(user_message, system_prompt)
-
+    @staticmethod
+    def _parse_tool_response(response: str) -> Dict[str, Any]:
+        """Classify a response as a tool call or a plain answer"""
         # Try to parse as JSON action
         try:
             if response.strip().startswith("{"):
@@ -144,3 +437,155 @@ If you need to use multiple tools, respond with one tool call at a time."""
             pass
 
         return {"type": "response", "data": response}
+
+    def process_with_tools(self, user_message: str, available_tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Process message with tool availability information"""
+        system_prompt = self._build_tools_prompt(available_tools)
+        response = self.call_api(user_message, system_prompt)
+        return self._parse_tool_response(response)
+
+
+class AsyncAIEngine(AIEngine):
+    """Non-blocking AI engine with the same surface as AIEngine
+
+    Uses httpx.AsyncClient (HTTP/2 when the h2 package is installed) so the
+    gateway event loop keeps serving channels while requests are in flight.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Get the shared async HTTP client (created lazily on the running loop)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the async HTTP client and the blocking session"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.close()
+
+    async def call_api(
+        self,
+        user_message: str,
+        system_prompt: Optional[SystemPrompt] = None,
+        stream: bool = False,
+        on_delta: Optional[Callable[[str], None]] = None,
+        cacheable: bool = False,
+    ) -> str:
+        """Call AI API without blocking the event loop"""
+        if stream:
+            parts = []
+            async for delta in self.stream_api(user_message, system_prompt):
+                parts.append(delta)
+                if on_delta:
+                    on_delta(delta)
+            return "".join(parts)
+
+        self.add_message("user", user_message)
+        payload = self._build_payload(system_prompt)
+
+        cache_key, cached = self._cached_response(payload, cacheable)
+        if cached is not None:
+            self.add_message("assistant", cached)
+            return cached
+
+        try:
+            response = await self.client.post(
+                f"{self.api_base_url}/v1/chat/completions",
+                json=payload,
+            )
+            response.raise_for_status()
+
+            result = response.json()
+            self._record_usage(result.get("usage"))
+            assistant_message = result["choices"][0]["message"]["content"]
+            self.add_message("assistant", assistant_message)
+            if cache_key:
+                self.response_cache.put(cache_key, assistant_message)
+
+            return assistant_message
+
+        except httpx.HTTPError as e:
+            error_msg = f"API Error: {str(e)}"
+            self.add_message("assistant", error_msg)
+            return error_msg
+
+    async def call_api_with_tools(
+        self,
+        user_message: str,
+        system_prompt: Optional[SystemPrompt],
+        tools: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Call AI API with native function calling without blocking the event loop"""
+        self.add_message("user", user_message)
+        payload = self._build_tools_payload(system_prompt, tools)
+
+        try:
+            response = await self.client.post(
+                f"{self.api_base_url}/v1/chat/completions",
+                json=payload,
+            )
+            response.raise_for_status()
+
+            data = response.json()
+            self._record_usage(data.get("usage"))
+            result = self._parse_tool_calls(data["choices"][0]["message"])
+            self.add_message("assistant", self._describe_tool_calls(result))
+
+            return result
+
+        except httpx.HTTPError as e:
+            error_msg = f"API Error: {str(e)}"
+            self.add_message("assistant", error_msg)
+            return {"content": error_msg, "tool_calls": []}
+
+    async def stream_api(self, user_message: str, system_prompt: Optional[SystemPrompt] = None) -> AsyncIterator[str]:
+        """Call AI API in streaming (SSE) mode and yield content deltas"""
+        self.add_message("user", user_message)
+        payload = self._build_payload(system_prompt, stream=True)
+
+        parts = []
+        try:
+            async with self.client.stream(
+                "POST",
+                f"{self.api_base_url}/v1/chat/completions",
+                json=payload,
+            ) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    delta = self._read_sse_line(line)
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+
+        except httpx.HTTPError as e:
+            error_msg = f"API Error: {str(e)}"
+            self.add_message("assistant", error_msg)
+            yield error_msg
+            return
+
+        self.add_message("assistant", "".join(parts))
+
+    async def process_with_tools(self, user_message: str, available_tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Process message with tool availability information"""
+        system_prompt = self._build_tools_prompt(available_tools)
+        response = await self.call_api(user_message, system_prompt)
+        return self._parse_tool_response(response)
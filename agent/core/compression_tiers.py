@@ -0,0 +1,181 @@
+"""Tiered accumulated compression with background rolling summarization."""
+
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Optional
+
+ARCHIVE_LINE_PREFIX = "📁 详细内容:"
+
+
+def split_compression_text(text: str) -> list[str]:
+    """Split a legacy accumulated compression string into per-task entries."""
+    entries = []
+    current: list[str] = []
+    for line in text.split('\n'):
+        current.append(line)
+        # 每个任务摘要以存档路径行结尾
+        if line.startswith(ARCHIVE_LINE_PREFIX):
+            entries.append('\n'.join(current).strip())
+            current = []
+    remainder = '\n'.join(current).strip()
+    if remainder:
+        entries.append(remainder)
+    return [entry for entry in entries if entry]
+
+
+class TieredCompression:
+    """
+    Bounded accumulated compression.
+
+    The newest keep_recent task tables are kept verbatim (level 0). When the
+    rendered text exceeds token_budget, older entries are rolled up in a
+    background thread into coarser summaries (level 1, 2, ...), so steps
+    never wait for summarization. Each roll-up merges the oldest run of up
+    to fanout entries of the finest tier into one entry of the next tier,
+    so tiers stay separate and only the oldest history gets the coarsest
+    summaries. A roll-up is also scheduled on load, so history that is
+    already over budget shrinks without waiting for the next task.
+    """
+
+    def __init__(
+        self,
+        memory_manager,
+        summarize: Callable[[list[str], int], Optional[str]],
+        count_tokens: Callable[[str], int],
+        keep_recent: int | None = None,
+        token_budget: int | None = None,
+        max_level: int = 3,
+        fanout: int = 4,
+    ):
+        """
+        Initialize tiered compression.
+
+        Args:
+            memory_manager: MemoryManager used for persistence.
+            summarize: Callable(texts, level) returning the merged summary, or None on failure.
+            count_tokens: Callable returning the token count of a text.
+            keep_recent: Task tables kept verbatim (default: COMPRESSION_KEEP_RECENT or 5).
+            token_budget: Token budget for the rendered text (default: COMPRESSION_TOKEN_BUDGET or 6000).
+            max_level: Coarsest summary level.
+            fanout: Entries of one tier merged into a single entry of the next tier.
+        """
+        self.memory_manager = memory_manager
+        self.summarize = summarize
+        self.count_tokens = count_tokens
+        self.keep_recent = keep_recent if keep_recent is not None else int(os.getenv("COMPRESSION_KEEP_RECENT", "5"))
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv("COMPRESSION_TOKEN_BUDGET", "6000"))
+        self.max_level = max_level
+        self.fanout = max(fanout, 2)
+
+        self._lock = threading.Lock()
+        self._rollup_thread: threading.Thread | None = None
+        self._rendered: str | None = None
+
+        # 条目按新到旧排列：{"text": str, "level": int, "created_at": str}
+        self.entries: list[dict] = memory_manager.load_compression_tiers()
+        if not self.entries:
+            legacy = memory_manager.load_accumulated_compression()
+            if legacy.strip():
+                now = datetime.now().isoformat()
+                self.entries = [
+                    {"text": text, "level": 0, "created_at": now}
+                    for text in split_compression_text(legacy)
+                ]
+                self._persist()
+
+        # 启动时已超出预算的历史也在后台压缩，不必等到下一个任务
+        self.schedule_rollup()
+
+    def render(self) -> str:
+        """Render all tiers (newest first) as the accumulated compression text."""
+        with self._lock:
+            if self._rendered is None:
+                self._rendered = "\n\n".join(entry["text"] for entry in self.entries)
+            return self._rendered
+
+    def add(self, text: str) -> None:
+        """Add a new task table and schedule a background roll-up if over budget."""
+        with self._lock:
+            self.entries.insert(0, {"text": text, "level": 0, "created_at": datetime.now().isoformat()})
+            self._rendered = None
+            self._persist()
+        self.schedule_rollup()
+
+    def clear(self) -> None:
+        """Drop all tiers."""
+        with self._lock:
+            self.entries = []
+            self._rendered = None
+        # 文件由 MemoryManager.clear_all 一并删除
+
+    def _persist(self) -> None:
+        """Save tiers and the rendered text (caller holds the lock)."""
+        self._rendered = "\n\n".join(entry["text"] for entry in self.entries)
+        self.memory_manager.save_compression_tiers(self.entries)
+        self.memory_manager.save_accumulated_compression(self._rendered)
+
+    def _over_budget(self) -> bool:
+        """Check whether the rendered text exceeds the token budget."""
+        return self.count_tokens(self.render()) > self.token_budget
+
+    def _plan_rollup(self) -> list[dict]:
+        """Pick the next group to merge: the oldest run of the finest tier beyond keep_recent (newest first)."""
+        with self._lock:
+            candidates = self.entries[self.keep_recent:]
+            for level in sorted({entry["level"] for entry in candidates}):
+                # 从最旧的一端取同一层级的连续条目，最多 fanout 条
+                run: list[dict] = []
+                for entry in reversed(candidates):
+                    if entry["level"] == level:
+                        run.append(entry)
+                        if len(run) == self.fanout:
+                            break
+                    elif run:
+                        break
+                # 最粗层级至少两条才合并；其他层级单条也可以压缩到下一层
+                if level < self.max_level or len(run) >= 2:
+                    return list(reversed(run))
+            return []
+
+    def schedule_rollup(self) -> None:
+        """Start a background roll-up if over budget and none is running."""
+        if not self._over_budget():
+            return
+        if self._rollup_thread is not None and self._rollup_thread.is_alive():
+            return
+        self._rollup_thread = threading.Thread(target=self._rollup, daemon=True)
+        self._rollup_thread.start()
+
+    def _rollup(self) -> None:
+        """Merge older tiers until the budget is met or nothing can be merged."""
+        try:
+            while self._over_budget():
+                group = self._plan_rollup()
+                if not group:
+                    return
+
+                level = min(group[0]["level"] + 1, self.max_level)
+                # 条目按新到旧排列，摘要时按时间顺序（旧到新）提供
+                summary = self.summarize([entry["text"] for entry in reversed(group)], level)
+                if not summary:
+                    return
+
+                with self._lock:
+                    positions = [i for i, entry in enumerate(self.entries) if any(entry is g for g in group)]
+                    if len(positions) != len(group):
+                        # 期间被清空或修改，放弃本次合并
+                        return
+                    insert_at = positions[0]
+                    for i in reversed(positions):
+                        del self.entries[i]
+                    self.entries.insert(insert_at, {
+                        "text": summary.strip(),
+                        "level": level,
+                        "created_at": datetime.now().isoformat(),
+                    })
+                    self._persist()
+
+                print(f"🗜️  已将 {len(group)} 条较早的任务摘要合并为第 {level} 层摘要")
+        except Exception as e:
+            print(f"⚠️  滚动压缩失败: {e}")
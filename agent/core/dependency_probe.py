@@ -0,0 +1,109 @@
+"""In-process, memoized probing of skill dependencies (binaries and env vars)"""
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class DependencyProbe:
+    """Resolve required binaries and environment variables, memoized with a TTL"""
+
+    def __init__(self, ttl: Optional[float] = None):
+        """
+        Initialize DependencyProbe
+
+        Args:
+            ttl: Seconds before cached results expire (default: SKILL_PROBE_TTL or 300)
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv("SKILL_PROBE_TTL", "300"))
+
+        self._lock = threading.Lock()
+        self._results: Dict[Tuple[str, str], bool] = {}  # (kind, name) -> 是否存在
+        self._expires_at = time.monotonic() + self.ttl
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped whenever cached results are dropped"""
+        with self._lock:
+            self._expire_if_stale()
+            return self._generation
+
+    def _expire_if_stale(self) -> None:
+        """Drop all results once the TTL has passed (caller holds the lock)"""
+        now = time.monotonic()
+        if now >= self._expires_at:
+            self._results.clear()
+            self._expires_at = now + self.ttl
+            self._generation += 1
+
+    def refresh(self) -> None:
+        """Drop all cached results so the next lookups probe again"""
+        with self._lock:
+            self._results.clear()
+            self._expires_at = time.monotonic() + self.ttl
+            self._generation += 1
+
+    def _lookup(self, kind: str, name: str) -> bool:
+        """Return a memoized probe result, probing on a miss"""
+        key = (kind, name)
+        with self._lock:
+            self._expire_if_stale()
+            if key in self._results:
+                self.hits += 1
+                return self._results[key]
+            self.misses += 1
+
+        if kind == "bin":
+            found = shutil.which(name) is not None
+        else:
+            found = bool(os.getenv(name))
+
+        with self._lock:
+            self._results[key] = found
+        return found
+
+    def has_binary(self, name: str) -> bool:
+        """Check if an executable exists in PATH"""
+        return self._lookup("bin", name)
+
+    def has_env(self, name: str) -> bool:
+        """Check if an environment variable is set and non-empty"""
+        return self._lookup("env", name)
+
+    def missing(self, requires_bins: str = "", requires_env: str = "") -> List[str]:
+        """
+        List missing requirements
+
+        Args:
+            requires_bins: Comma-separated binary names
+            requires_env: Comma-separated environment variable names
+
+        Returns:
+            List like ["bin:ffmpeg", "env:API_KEY"]
+        """
+        missing = []
+        for bin_name in requires_bins.split(","):
+            bin_name = bin_name.strip()
+            if bin_name and not self.has_binary(bin_name):
+                missing.append(f"bin:{bin_name}")
+        for env_var in requires_env.split(","):
+            env_var = env_var.strip()
+            if env_var and not self.has_env(env_var):
+                missing.append(f"env:{env_var}")
+        return missing
+
+    def get_stats(self) -> dict:
+        """Get probe cache metrics"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._results),
+                "generation": self._generation,
+                "ttl": self.ttl,
+            }
@@ -1,5 +1,6 @@
 """Extended tool executor with document reading capabilities"""
 import json
+import re
 from typing import Dict, Any, Callable, Optional
 from agent.tools.shell import ShellTool
 from agent.tools.file import FileTool
@@ -9,11 +10,33 @@ from agent.tools.skill_tool import SkillTool
 import os
 import requests
 
+# 参数说明格式："name (type): description, name (type): description"
+PARAM_PATTERN = re.compile(r"(\w+) \((string|number|integer|boolean)\): ")
+
+# 说明中没有写 default 但可以省略的参数
+OPTIONAL_PARAMS = {("search_files", "path"), ("generate_pdf", "format")}
+
+
+def params_to_schema(tool_name: str, params: str) -> Dict[str, Any]:
+    """Convert a tool's params description into a JSON schema object"""
+    properties = {}
+    required = []
+    matches = list(PARAM_PATTERN.finditer(params))
+    for i, match in enumerate(matches):
+        name, param_type = match.group(1), match.group(2)
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(params)
+        description = params[match.end():end].strip().rstrip(",").strip()
+        properties[name] = {"type": param_type, "description": description}
+        if "default" not in description and (tool_name, name) not in OPTIONAL_PARAMS:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
 
 class ExtendedToolExecutor:
     """Execute tools with extended capabilities including document reading"""
 
-    def __init__(self, skills_loader=None):
+    def __init__(self, skills_loader=None, memory_manager=None):
+        self.memory_manager = memory_manager
         self.shell_tool = ShellTool()
         self.file_tool = FileTool()
         self.pdf_tool = PDFTool()
@@ -40,6 +63,7 @@ class ExtendedToolExecutor:
             "send_file": self.execute_send_file,
             "generate_pdf": self.execute_generate_pdf,
             "load_skill": self.execute_load_skill,
+            "memory_search": self.execute_memory_search,
         }
 
     def get_available_tools(self) -> list:
@@ -150,6 +174,25 @@ class ExtendedToolExecutor:
                 "description": "Load a skill's complete content to get detailed guidance and instructions",
                 "params": "skill_name (string): Name of the skill to load (e.g., 'web', 'github', 'python')"
             },
+            {
+                "name": "memory_search",
+                "description": "Search compressed memory archives and return matching snippets with scores",
+                "params": "query (string): Keywords to search for, limit (number): Maximum archives to return (default: 5)"
+            },
+        ]
+
+    def get_tool_schemas(self) -> list:
+        """Get available tools as function-calling schemas (OpenAI "tools" format)"""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool["name"],
+                    "description": tool["description"],
+                    "parameters": params_to_schema(tool["name"], tool["params"]),
+                },
+            }
+            for tool in self.get_available_tools()
         ]
 
     def execute(self, tool_call: Dict[str, Any]) -> str:
@@ -525,7 +568,7 @@ class ExtendedToolExecutor:
 
         minutes = params.get("minutes", 0)
         message = params.get("message", "时间到了！")
-        executor = params.get("executor", None)  # 获取执行器引用
+        on_fire = params.get("on_fire", None)  # 触发时的回调（在定时器线程中调用）
 
         if not isinstance(minutes, (int, float)) or minutes <= 0:
             return "Error: minutes 必须是正数"
@@ -538,10 +581,9 @@ class ExtendedToolExecutor:
                 time.sleep(seconds)
                 print(f"\n⏰ 【定时器触发】{message}\n")
 
-                # 如果有执行器引用，设置标志
-                if executor:
-                    executor.timer_triggered = True
-                    executor.waiting_for_timer = False
+                # 通知执行器继续执行等待定时器的任务
+                if on_fire:
+                    on_fire()
 
             # 在后台线程中运行定时器
             timer_thread = threading.Thread(target=timer_callback, daemon=True)
@@ -654,3 +696,35 @@ class ExtendedToolExecutor:
         success, content = self.skill_tool.load_skill(skill_name)
         return content
 
+    def execute_memory_search(self, params: Dict[str, Any]) -> str:
+        """Search compressed memory archives"""
+        if not self.memory_manager:
+            return "Error: Memory manager not initialized"
+
+        query = str(params.get("query", "")).strip()
+        if not query:
+            return "Error: query parameter required"
+
+        try:
+            limit = int(params.get("limit", 5))
+        except (TypeError, ValueError):
+            limit = 5
+
+        results = self.memory_manager.search_archives(query, limit=max(1, limit))
+        if not results:
+            return f"未找到与 '{query}' 相关的历史记忆"
+
+        lines = [f"找到 {len(results)} 个相关存档:"]
+        for i, result in enumerate(results, 1):
+            archive_path = self.memory_manager.memory_dir / result["doc_id"]
+            lines.append(f"\n[{i}] {archive_path} (score: {result['score']})")
+            for snippet in result["snippets"]:
+                lines.append(f"  L{snippet['line']}: {snippet['text']}")
+        return "\n".join(lines)
+
+
+def execute_isolated(tool_call: Dict[str, Any], cwd: Optional[str] = None) -> str:
+    """Execute a stateless tool call in a worker process"""
+    if cwd:
+        os.chdir(cwd)
+    return ExtendedToolExecutor().execute(tool_call)
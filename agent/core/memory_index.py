@@ -0,0 +1,211 @@
+"""Incremental full-text index over compressed memory archives."""
+
+import re
+import math
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+from collections import Counter, defaultdict
+
+# 英文/数字按单词切分；中文按二元组（bigram）切分，单个汉字保留为单字
+WORD_PATTERN = re.compile(r"[a-zA-Z0-9_]+")
+CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]+")
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    doc_id TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (doc_id, line_no)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    line_no INTEGER NOT NULL,
+    tf INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_postings_term ON postings (term);
+CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into index terms (lowercase words and CJK bigrams)."""
+    tokens = [word.lower() for word in WORD_PATTERN.findall(text)]
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class MemoryIndex:
+    """
+    Inverted index over memory archives, stored in SQLite.
+
+    Documents are added once when an archive is written; queries only touch
+    the postings of the query terms and return ranked line snippets.
+    """
+
+    def __init__(self, index_file: Path):
+        """
+        Initialize memory index.
+
+        Args:
+            index_file: Path to the index database file.
+        """
+        self.index_file = Path(index_file)
+        self.is_new = not self.index_file.exists()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.index_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Close the index database."""
+        with self._lock:
+            self._conn.close()
+
+    def has_document(self, doc_id: str) -> bool:
+        """Check whether a document is already indexed."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        return row is not None
+
+    def add_document(self, doc_id: str, text: str, created_at: str | None = None) -> None:
+        """
+        Index one archive (replaces any previous version of the same doc).
+
+        Args:
+            doc_id: Archive path relative to the Memory folder.
+            text: Archive content.
+            created_at: ISO timestamp (default: now).
+        """
+        line_rows = []
+        posting_rows = []
+        length = 0
+        for line_no, line in enumerate(text.split('\n')):
+            if not line.strip():
+                continue
+            line_rows.append((doc_id, line_no, line))
+            counts = Counter(tokenize(line))
+            length += sum(counts.values())
+            posting_rows.extend((term, doc_id, line_no, tf) for term, tf in counts.items())
+
+        with self._lock:
+            with self._conn:
+                self._delete(doc_id)
+                self._conn.execute(
+                    "INSERT INTO docs (doc_id, created_at, length) VALUES (?, ?, ?)",
+                    (doc_id, created_at or datetime.now().isoformat(), length),
+                )
+                self._conn.executemany("INSERT INTO lines (doc_id, line_no, text) VALUES (?, ?, ?)", line_rows)
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, line_no, tf) VALUES (?, ?, ?, ?)", posting_rows
+                )
+
+    def remove_document(self, doc_id: str) -> None:
+        """Remove a document from the index."""
+        with self._lock:
+            with self._conn:
+                self._delete(doc_id)
+
+    def _delete(self, doc_id: str) -> None:
+        """Delete all rows of a document (caller holds the transaction)."""
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM lines WHERE doc_id = ?", (doc_id,))
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+
+    def search(self, query: str, limit: int = 5, snippets_per_doc: int = 3, max_snippet_length: int = 200) -> list[dict]:
+        """
+        Search archives with BM25 ranking.
+
+        Args:
+            query: Free-text query.
+            limit: Maximum number of documents to return.
+            snippets_per_doc: Maximum matching lines returned per document.
+            max_snippet_length: Truncate each snippet line to this many characters.
+
+        Returns:
+            List of {"doc_id", "score", "created_at", "snippets": [{"line", "text"}]} sorted by score.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count, total_length = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not doc_count:
+                return []
+            avg_length = total_length / doc_count or 1
+
+            doc_tf: dict[str, Counter] = defaultdict(Counter)
+            line_hits: dict[tuple[str, int], set] = defaultdict(set)
+            for term in terms:
+                for doc_id, line_no, tf in self._conn.execute(
+                    "SELECT doc_id, line_no, tf FROM postings WHERE term = ?", (term,)
+                ):
+                    doc_tf[doc_id][term] += tf
+                    line_hits[(doc_id, line_no)].add(term)
+
+            if not doc_tf:
+                return []
+
+            doc_info = {
+                doc_id: (created_at, length)
+                for doc_id, created_at, length in self._conn.execute(
+                    f"SELECT doc_id, created_at, length FROM docs WHERE doc_id IN ({','.join('?' * len(doc_tf))})",
+                    tuple(doc_tf),
+                )
+            }
+
+            df = Counter(term for counts in doc_tf.values() for term in counts)
+            scored = []
+            for doc_id, counts in doc_tf.items():
+                created_at, length = doc_info.get(doc_id, ("", avg_length))
+                score = 0.0
+                for term, tf in counts.items():
+                    idf = math.log(1 + (doc_count - df[term] + 0.5) / (df[term] + 0.5))
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    score += idf * tf * (BM25_K1 + 1) / norm
+                scored.append((score, doc_id, created_at))
+
+            scored.sort(key=lambda item: (-item[0], item[1]))
+            results = []
+            for score, doc_id, created_at in scored[:limit]:
+                # 命中查询词最多的行作为片段，按行号排序输出
+                lines = sorted(
+                    (line_no for (hit_doc, line_no) in line_hits if hit_doc == doc_id),
+                    key=lambda line_no: (-len(line_hits[(doc_id, line_no)]), line_no),
+                )[:snippets_per_doc]
+                snippets = []
+                for line_no in sorted(lines):
+                    row = self._conn.execute(
+                        "SELECT text FROM lines WHERE doc_id = ? AND line_no = ?", (doc_id, line_no)
+                    ).fetchone()
+                    if row:
+                        text = row[0].strip()
+                        if len(text) > max_snippet_length:
+                            text = text[:max_snippet_length] + "..."
+                        snippets.append({"line": line_no + 1, "text": text})
+
+                results.append({
+                    "doc_id": doc_id,
+                    "score": round(score, 3),
+                    "created_at": created_at,
+                    "snippets": snippets,
+                })
+
+        return results
@@ -1,20 +1,41 @@
 """Memory management system for storing and retrieving compressed context."""
 
+import os
 import json
+import time
+import queue
+import atexit
 import asyncio
+import threading
 from pathlib import Path
 from datetime import datetime
 
+from agent.core.memory_index import MemoryIndex
+from agent.core.token_counter import create_token_counter
+
+# fsync 策略：always = 每批写入后 fsync；interval = 至多每隔 fsync_interval 秒 fsync；never = 交给操作系统
+FSYNC_POLICIES = ("always", "interval", "never")
+
 
 class MemoryManager:
     """Manages persistent memory storage for accumulated compression and metadata."""
 
-    def __init__(self, memory_dir: str | None = None):
+    def __init__(
+        self,
+        memory_dir: str | None = None,
+        fsync_policy: str | None = None,
+        fsync_interval: float | None = None,
+    ):
         """
         Initialize memory manager.
 
+        The execution history is kept in memory and persisted by a background
+        write-behind thread, so each step costs O(new entries) of file I/O.
+
         Args:
             memory_dir: Path to memory directory. If None, uses default Memory folder.
+            fsync_policy: One of "always", "interval", "never" (default: MEMORY_FSYNC or "interval").
+            fsync_interval: Seconds between fsyncs for the "interval" policy (default: MEMORY_FSYNC_INTERVAL or 1.0).
         """
         if memory_dir is None:
             memory_dir = str(Path(__file__).parent.parent.parent / "Memory")
@@ -25,6 +46,29 @@ class MemoryManager:
         self.compression_file = self.memory_dir / "accumulated_compression.md"
         self.execution_history_file = self.memory_dir / "execution_history.md"
         self.index_file = self.memory_dir / "index.json"
+        self.compression_tiers_file = self.memory_dir / "compression_tiers.json"
+        self.search_index_file = self.memory_dir / "search_index.db"
+        self._search_index: MemoryIndex | None = None
+
+        self.fsync_policy = (fsync_policy or os.getenv("MEMORY_FSYNC", "interval")).lower()
+        if self.fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy '{self.fsync_policy}', expected one of {FSYNC_POLICIES}")
+        self.fsync_interval = fsync_interval if fsync_interval is not None else float(os.getenv("MEMORY_FSYNC_INTERVAL", "1.0"))
+
+        # 内存中的权威执行历史（只在启动时从磁盘加载一次）
+        self._history_lock = threading.Lock()
+        self._history: list[str] = self._read_execution_history_file()
+
+        # 执行历史的 token 总数随追加增量更新，不再每次重新扫描全文
+        self.token_counter = create_token_counter()
+        self._history_tokens = self._count_lines(self._history)
+
+        # 写后队列：("append", [entries])、("rewrite", [entries]) 或 ("sync", [])，由后台线程按顺序落盘
+        self._write_queue: queue.Queue = queue.Queue()
+        self._writer_thread: threading.Thread | None = None
+        self._last_fsync = 0.0
+        self._fsync_pending = False  # interval 策略下已写入但尚未 fsync 的数据
+        atexit.register(self.flush)
 
     def _get_today_folder(self) -> Path:
         """Get or create today's date folder."""
@@ -50,6 +94,22 @@ class MemoryManager:
         with open(self.compression_file, 'w', encoding='utf-8') as f:
             f.write(compression)
 
+    def load_compression_tiers(self) -> list[dict]:
+        """Load tiered compression entries (newest first)."""
+        if self.compression_tiers_file.exists():
+            try:
+                content = self.compression_tiers_file.read_text(encoding='utf-8').strip()
+                if content:
+                    return json.loads(content)
+            except json.JSONDecodeError:
+                pass
+        return []
+
+    def save_compression_tiers(self, entries: list[dict]) -> None:
+        """Save tiered compression entries (newest first)."""
+        with open(self.compression_tiers_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+
     def save_compression_archive(self, compression_content: str) -> str:
         """
         Save compression to archive folder with date and timestamp.
@@ -64,22 +124,172 @@ class MemoryManager:
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(compression_content)
 
-        # Return relative path from Memory folder
-        return f"{filepath.relative_to(self.memory_dir)}"
+        relative_path = f"{filepath.relative_to(self.memory_dir)}"
 
-    def load_execution_history(self) -> list[str]:
-        """Load execution history from file."""
+        # 存档时增量更新全文索引
+        try:
+            self.search_index.add_document(relative_path, compression_content)
+        except Exception as e:
+            print(f"⚠️  更新记忆索引失败: {e}")
+
+        # Return relative path from Memory folder
+        return relative_path
+
+    @property
+    def search_index(self) -> MemoryIndex:
+        """Full-text index over archives (existing archives are indexed on first use)."""
+        if self._search_index is None:
+            search_index = MemoryIndex(self.search_index_file)
+            if search_index.is_new:
+                for archive_file in sorted(self.memory_dir.glob("*/*_历史.md")):
+                    search_index.add_document(
+                        str(archive_file.relative_to(self.memory_dir)),
+                        archive_file.read_text(encoding='utf-8'),
+                        datetime.fromtimestamp(archive_file.stat().st_mtime).isoformat(),
+                    )
+            self._search_index = search_index
+        return self._search_index
+
+    def search_archives(self, query: str, limit: int = 5) -> list[dict]:
+        """Search archived task histories and return ranked snippets."""
+        return self.search_index.search(query, limit=limit)
+
+    def _read_execution_history_file(self) -> list[str]:
+        """Read execution history from disk (startup only)."""
         if self.execution_history_file.exists():
             with open(self.execution_history_file, 'r', encoding='utf-8') as f:
                 lines = f.read().strip().split('\n')
                 return [line for line in lines if line.strip()]
         return []
 
+    def _ensure_writer(self) -> None:
+        """Start the write-behind thread if it is not running."""
+        if self._writer_thread is None or not self._writer_thread.is_alive():
+            self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer_thread.start()
+
+    def _enqueue_write(self, op: str, entries: list[str]) -> None:
+        """Queue a history write for the background thread."""
+        self._ensure_writer()
+        self._write_queue.put((op, entries))
+
+    def _writer_loop(self) -> None:
+        """Drain the write queue, batching consecutive appends into one write."""
+        stopping = False
+        while not stopping:
+            item = self._write_queue.get()
+            batch = [item]
+            # 批量取出队列中已有的写操作
+            while True:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # None 为 close() 放入的停止标记，("sync", []) 为 flush() 放入的强制落盘标记
+            stopping = any(write is None for write in batch)
+            sync = stopping or any(write is not None and write[0] == "sync" for write in batch)
+            writes = [write for write in batch if write is not None and write[0] != "sync"]
+            try:
+                if writes:
+                    self._apply_writes(writes)
+                if sync:
+                    self._sync_pending_writes()
+            except Exception as e:
+                print(f"⚠️  写入执行历史失败: {e}")
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
+    def _apply_writes(self, batch: list[tuple[str, list[str]]]) -> None:
+        """Apply a batch of queued writes in order."""
+        pending: list[str] = []
+        mode = 'a'
+
+        for op, entries in batch:
+            if op == "rewrite":
+                # 覆盖写之前排队的追加已无意义，直接丢弃
+                pending = list(entries)
+                mode = 'w'
+            else:
+                pending.extend(entries)
+
+        if not pending and mode == 'a':
+            return
+
+        with open(self.execution_history_file, mode, encoding='utf-8') as f:
+            f.write("".join(entry + '\n' for entry in pending))
+            f.flush()
+            self._maybe_fsync(f)
+
+    def _maybe_fsync(self, f) -> None:
+        """fsync according to the configured policy."""
+        if self.fsync_policy == "never":
+            return
+        now = time.monotonic()
+        if self.fsync_policy == "always" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(f.fileno())
+            self._last_fsync = now
+            self._fsync_pending = False
+        else:
+            self._fsync_pending = True
+
+    def _sync_pending_writes(self) -> None:
+        """fsync writes the interval policy has not synced yet (on flush/close)."""
+        if not self._fsync_pending or not self.execution_history_file.exists():
+            return
+        with open(self.execution_history_file, 'a', encoding='utf-8') as f:
+            os.fsync(f.fileno())
+        self._last_fsync = time.monotonic()
+        self._fsync_pending = False
+
+    def flush(self, timeout: float | None = None) -> None:
+        """Block until all queued history writes have reached the file and been fsynced."""
+        if self._writer_thread is None:
+            return
+        # 无论距上次 fsync 多久，flush 都让写线程把尚未 fsync 的数据落盘
+        self._enqueue_write("sync", [])
+        if timeout is None:
+            self._write_queue.join()
+            return
+
+        deadline = time.monotonic() + timeout
+        while self._write_queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def close(self) -> None:
+        """Flush pending writes, stop the writer thread and release the search index."""
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            self._write_queue.put(None)
+            self._writer_thread.join()
+        self._writer_thread = None
+        if self._search_index is not None:
+            self._search_index.close()
+            self._search_index = None
+        atexit.unregister(self.flush)
+
+    def load_execution_history(self) -> list[str]:
+        """Load execution history (served from memory)."""
+        with self._history_lock:
+            return list(self._history)
+
+    def _count_lines(self, lines: list[str]) -> int:
+        """Count tokens of history lines (each line plus its newline separator)."""
+        return sum(self.token_counter.count(line) + 1 for line in lines)
+
+    def history_token_count(self) -> int:
+        """Get the running token total of the execution history."""
+        with self._history_lock:
+            if not self._history:
+                return 0
+            return self._history_tokens + self.token_counter.overhead
+
     def save_execution_history(self, history: list[str]) -> None:
         """Save execution history to file."""
-        with open(self.execution_history_file, 'w', encoding='utf-8') as f:
-            for entry in history:
-                f.write(entry + '\n')
+        with self._history_lock:
+            self._history = [line for entry in history for line in entry.split('\n') if line.strip()]
+            self._history_tokens = self._count_lines(self._history)
+            self._enqueue_write("rewrite", list(history))
 
     async def async_save_execution_history(self, history: list[str]) -> None:
         """Asynchronously save execution history to file."""
@@ -87,9 +297,12 @@ class MemoryManager:
         await loop.run_in_executor(None, self.save_execution_history, history)
 
     def append_execution_step(self, step: str) -> None:
-        """Append a single execution step to history file."""
-        with open(self.execution_history_file, 'a', encoding='utf-8') as f:
-            f.write(step + '\n')
+        """Append a single execution step to history (persisted write-behind)."""
+        with self._history_lock:
+            lines = [line for line in step.split('\n') if line.strip()]
+            self._history.extend(lines)
+            self._history_tokens += self._count_lines(lines)
+            self._enqueue_write("append", [step])
 
     async def async_append_execution_step(self, step: str) -> None:
         """Asynchronously append a single execution step to history file."""
@@ -134,6 +347,15 @@ class MemoryManager:
         """Clear all memory files including archives."""
         import shutil
 
+        # 先让后台线程写完，再删除文件
+        self.flush()
+        if self._search_index is not None:
+            self._search_index.close()
+            self._search_index = None
+        with self._history_lock:
+            self._history = []
+            self._history_tokens = 0
+
         # Clear main memory files
         if self.compression_file.exists():
             self.compression_file.unlink()
@@ -141,6 +363,8 @@ class MemoryManager:
             self.execution_history_file.unlink()
         if self.index_file.exists():
             self.index_file.unlink()
+        if self.compression_tiers_file.exists():
+            self.compression_tiers_file.unlink()
 
         # Clear all archived files in date-based folders
         if self.memory_dir.exists():
@@ -156,8 +380,10 @@ class MemoryManager:
     def clear_execution_history(self) -> None:
         """Clear only the execution history file content (keep the file)."""
         # 清空文件内容而不是删除文件
-        with open(self.execution_history_file, 'w', encoding='utf-8') as f:
-            f.write("")
+        with self._history_lock:
+            self._history = []
+            self._history_tokens = 0
+            self._enqueue_write("rewrite", [])
 
     def get_memory_stats(self) -> dict:
         """Get statistics about stored memories."""
@@ -174,3 +400,23 @@ class MemoryManager:
         }
 
 
+def create_memory_manager(memory_dir: str | None = None, backend: str | None = None) -> MemoryManager:
+    """
+    Create a memory manager for the configured backend.
+
+    Args:
+        memory_dir: Path to memory directory. If None, uses default Memory folder.
+        backend: "files" or "sqlite" (default: MEMORY_BACKEND or "files").
+
+    Returns:
+        MemoryManager instance.
+    """
+    backend = (backend or os.getenv("MEMORY_BACKEND", "files")).lower()
+
+    if backend == "sqlite":
+        from agent.core.sqlite_memory import SQLiteMemoryManager
+        return SQLiteMemoryManager(memory_dir)
+    if backend != "files":
+        raise ValueError(f"Unknown memory backend '{backend}', expected 'files' or 'sqlite'")
+
+    return MemoryManager(memory_dir)
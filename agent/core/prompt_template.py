@@ -0,0 +1,150 @@
+"""Compiled prompt template for Agent.md"""
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# 只匹配 {snake_case} 形式的占位符，JSON 示例中的 {"action": ...} 不受影响
+PLACEHOLDER_PATTERN = re.compile(r"\{([a-z][a-z0-9_]*)\}")
+
+
+class CompiledTemplate:
+    """Template text pre-split into literal segments and placeholder slots"""
+
+    def __init__(self, text: str):
+        self.parts: List[str] = []
+        self.slots: List[Tuple[int, str]] = []  # (parts 中的位置, 占位符名称)
+
+        last_end = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            self.parts.append(text[last_end:match.start()])
+            self.slots.append((len(self.parts), match.group(1)))
+            self.parts.append(match.group(0))
+            last_end = match.end()
+        self.parts.append(text[last_end:])
+
+    @property
+    def placeholders(self) -> List[str]:
+        """Names of all placeholders in template order"""
+        return [name for _, name in self.slots]
+
+    def render(self, values: Dict[str, str]) -> str:
+        """Render in a single pass; unknown placeholders are left untouched"""
+        parts = list(self.parts)
+        for index, name in self.slots:
+            if name in values:
+                parts[index] = values[name]
+        return "".join(parts)
+
+
+class PromptTemplate:
+    """Agent.md prompt template, compiled once and reloaded on file change"""
+
+    def __init__(self, path: Path, split_marker: str = "【用户任务】", volatile_marker: str = "## 当前状态"):
+        """
+        Initialize prompt template
+
+        Args:
+            path: Path to the template file (Agent.md)
+            split_marker: Marker separating the system prompt from the user message
+            volatile_marker: Marker where the per-step part of the system prompt starts;
+                everything before it stays identical across steps and can be cached
+                by the provider
+        """
+        self.path = Path(path)
+        self.split_marker = split_marker
+        self.volatile_marker = volatile_marker
+
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[int, int]] = None  # (mtime_ns, size)
+        self._stable: Optional[CompiledTemplate] = None
+        self._volatile: Optional[CompiledTemplate] = None
+        self._user: Optional[CompiledTemplate] = None
+
+        self.compile_count = 0
+        self.render_count = 0
+        self.last_render_ms = 0.0
+        self.total_render_ms = 0.0
+
+    def _ensure_compiled(self) -> None:
+        """Compile the template, or recompile if the file changed on disk"""
+        stat = self.path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            if signature == self._signature:
+                return
+
+            with open(self.path, 'r', encoding='utf-8') as f:
+                text = f.read()
+
+            # 分离系统提示词和用户消息部分
+            split_idx = text.find(self.split_marker)
+            if split_idx >= 0:
+                system_text, user_text = text[:split_idx], text[split_idx:]
+            else:
+                # 如果找不到分割点，全部作为系统提示词
+                system_text, user_text = text, ""
+
+            # 系统提示词再分为稳定前缀和每步变化的后缀（便于服务端缓存前缀）
+            volatile_idx = system_text.find(self.volatile_marker)
+            if volatile_idx >= 0:
+                stable_text, volatile_text = system_text[:volatile_idx], system_text[volatile_idx:]
+            else:
+                stable_text, volatile_text = system_text, ""
+
+            self._stable = CompiledTemplate(stable_text)
+            self._volatile = CompiledTemplate(volatile_text)
+            self._user = CompiledTemplate(user_text)
+            self._signature = signature
+            self.compile_count += 1
+
+    def render(self, values: Dict[str, str]) -> Tuple[str, str]:
+        """
+        Render the template
+
+        Args:
+            values: Placeholder values shared by all template parts
+
+        Returns:
+            Tuple of (system_prompt, user_message)
+        """
+        stable_prefix, volatile_suffix, user_message = self.render_segments(values)
+        return stable_prefix + volatile_suffix, user_message
+
+    def render_segments(self, values: Dict[str, str]) -> Tuple[str, str, str]:
+        """
+        Render the template with the system prompt split for prefix caching
+
+        Args:
+            values: Placeholder values shared by all template parts
+
+        Returns:
+            Tuple of (stable_prefix, volatile_suffix, user_message)
+        """
+        start = time.perf_counter()
+
+        self._ensure_compiled()
+        stable_prefix = self._stable.render(values)
+        volatile_suffix = self._volatile.render(values)
+        user_message = self._user.render(values)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_render_ms = elapsed_ms
+        self.total_render_ms += elapsed_ms
+        self.render_count += 1
+
+        return stable_prefix, volatile_suffix, user_message
+
+    def get_stats(self) -> dict:
+        """Get render metrics"""
+        return {
+            "compile_count": self.compile_count,
+            "render_count": self.render_count,
+            "cache_hits": max(self.render_count - self.compile_count, 0),  # 复用已编译模板的渲染次数
+            "last_render_ms": round(self.last_render_ms, 3),
+            "avg_render_ms": round(self.total_render_ms / self.render_count, 3) if self.render_count else 0.0,
+        }
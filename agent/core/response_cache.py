@@ -0,0 +1,183 @@
+"""On-disk LRU cache for AI responses to deterministic sub-calls"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+"""
+
+
+def make_cache_key(base_url: str, payload: Dict[str, Any]) -> str:
+    """Hash of everything that determines a completion
+
+    The whole request payload is included (model, temperature, max_tokens,
+    messages, tool schemas, ...), plus the endpoint, so calls that differ in
+    any of them never share an entry.
+    """
+    raw = json.dumps(
+        {"base_url": base_url, "payload": payload},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed LRU store of completions keyed by make_cache_key()
+
+    Entries expire after ttl seconds; once the store holds more than
+    max_entries rows or max_bytes of responses, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(
+        self,
+        db_file: str,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        """
+        Initialize ResponseCache
+
+        Args:
+            db_file: Path to the SQLite database
+            ttl: Seconds an entry stays valid (default: LLM_CACHE_TTL or 86400)
+            max_entries: Maximum number of entries (default: LLM_CACHE_MAX_ENTRIES or 1000)
+            max_bytes: Maximum total response size (default: LLM_CACHE_MAX_MB or 50 MB)
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", "86400"))
+        self.max_entries = max_entries or int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+        self.max_bytes = max_bytes or int(float(os.getenv("LLM_CACHE_MAX_MB", "50")) * 1024 * 1024)
+
+        Path(db_file).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached response (None on a miss, an expired entry or a database error)"""
+        try:
+            return self._get(key)
+        except sqlite3.Error as e:
+            print(f"⚠️  响应缓存读取失败: {e}")
+            self.misses += 1
+            return None
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response and evict entries beyond the limits
+
+        Database errors (locked or full disk, ...) are logged and swallowed:
+        the response itself already succeeded and must still be returned.
+        """
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, response, size, now, now),
+                )
+                self._evict(now)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                print(f"⚠️  响应缓存写入失败: {e}")
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones over the caps (caller holds the lock)"""
+        cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self.evictions += cursor.rowcount
+
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def get_stats(self) -> dict:
+        """Get cache metrics"""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+            "ttl": self.ttl,
+        }
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the process-wide response cache, or None unless LLM_CACHE=true"""
+    global _shared_cache
+    if os.getenv("LLM_CACHE", "false").lower() != "true":
+        return None
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                # 不放在 Memory 下：/clear 会删除整个 Memory 目录
+                default_file = Path(__file__).parent.parent.parent / "Cache" / "llm_cache.db"
+                _shared_cache = ResponseCache(os.getenv("LLM_CACHE_FILE", str(default_file)))
+    return _shared_cache
@@ -0,0 +1,129 @@
+"""Per-chat executor sessions for the gateway."""
+
+import os
+import re
+import time
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+def session_dir_name(session_key: str) -> str:
+    """Turn a session key like "feishu:oc_xxx" into a safe directory name."""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", session_key)
+
+
+class Session:
+    """One chat's executor plus its scheduling state."""
+
+    def __init__(self, key: str, executor: Any):
+        self.key = key
+        self.executor = executor
+        self.lock = asyncio.Lock()  # 同一会话内的任务按顺序执行
+        self.pending = 0  # 已排队或正在执行的任务数
+        self.last_active = time.monotonic()
+
+    def touch(self) -> None:
+        """Mark the session as recently used."""
+        self.last_active = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        """Whether the session has queued work or a task suspended on an approval or timer."""
+        return self.pending > 0 or getattr(self.executor, "suspended", False)
+
+
+class SessionManager:
+    """
+    Keeps one executor per session key.
+
+    Each chat gets isolated executor state and memory. Tasks of different
+    sessions run concurrently up to max_concurrent; tasks of one session run
+    in order. Sessions idle for longer than idle_timeout are closed (their
+    memory is already persisted) and recreated from disk on the next message.
+    """
+
+    def __init__(
+        self,
+        executor_factory: Callable[[str], Any],
+        max_concurrent: int | None = None,
+        idle_timeout: float | None = None,
+    ):
+        """
+        Initialize session manager.
+
+        Args:
+            executor_factory: Callable(session_key) returning a new executor.
+            max_concurrent: Sessions running a task at the same time (default: GATEWAY_MAX_CONCURRENT or 4).
+            idle_timeout: Seconds of inactivity before a session is evicted (default: SESSION_IDLE_TIMEOUT or 1800).
+        """
+        self.executor_factory = executor_factory
+        self.max_concurrent = max_concurrent if max_concurrent is not None else int(os.getenv("GATEWAY_MAX_CONCURRENT", "4"))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+
+        self.sessions: dict[str, Session] = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._closing: dict[str, asyncio.Task] = {}  # 正在关闭（写回记忆）的会话
+
+    async def get(self, session_key: str) -> Session:
+        """Get the session for a key, creating (or reloading) it if needed."""
+        # 会话正在关闭时先等它写完记忆，否则新执行器会读到不完整的历史并在之后覆盖它
+        while session_key in self._closing and session_key not in self.sessions:
+            await asyncio.shield(self._closing[session_key])
+
+        session = self.sessions.get(session_key)
+        if session is None:
+            session = Session(session_key, self.executor_factory(session_key))
+            self.sessions[session_key] = session
+            print(f"🧵 新建会话: {session_key}（当前 {len(self.sessions)} 个）")
+        session.touch()
+        return session
+
+    async def run(self, session: Session, coro: Awaitable) -> None:
+        """Run a coroutine for a session: in order within the session, bounded across sessions."""
+        session.pending += 1
+        try:
+            async with session.lock:
+                async with self._semaphore:
+                    await coro
+        except Exception as e:
+            print(f"❌ 处理消息错误: {e}")
+        finally:
+            session.pending -= 1
+            session.touch()
+
+    async def evict(self, session_key: str) -> None:
+        """Close a session's executor and drop it from memory."""
+        session = self.sessions.pop(session_key, None)
+        if session is None:
+            return
+        # 关闭完成（而不是 evict 返回）时才移除标记，evict 被取消时 get 仍会等待写回结束
+        closing = self._closing[session_key] = asyncio.ensure_future(self._close(session))
+        closing.add_done_callback(lambda task: self._closing.pop(session_key, None))
+        await asyncio.shield(closing)
+        print(f"💤 会话已空闲回收: {session_key}（剩余 {len(self.sessions)} 个）")
+
+    @staticmethod
+    async def _close(session: Session) -> None:
+        """Close one executor, flushing its memory (errors are logged, not raised)."""
+        try:
+            await session.executor.aclose()
+        except Exception as e:
+            print(f"⚠️  关闭会话 {session.key} 失败: {e}")
+
+    async def evict_idle(self) -> None:
+        """Evict every session idle for longer than idle_timeout."""
+        now = time.monotonic()
+        for key, session in list(self.sessions.items()):
+            if not session.busy and now - session.last_active > self.idle_timeout:
+                await self.evict(key)
+
+    async def evict_idle_loop(self, interval: float = 60.0) -> None:
+        """Periodically evict idle sessions."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    async def close_all(self) -> None:
+        """Close every session (on shutdown)."""
+        for key in list(self.sessions):
+            await self.evict(key)
@@ -1,22 +1,29 @@
 """Skills system for Minibot - modular capability extensions"""
-import os
 import json
 from pathlib import Path
 from typing import Optional, List, Dict
 import re
-import subprocess
+import threading
+
+from agent.core.dependency_probe import DependencyProbe
 
 
 class SkillsLoader:
     """Load and manage skills from workspace and builtin directories"""
 
-    def __init__(self, workspace: Path, builtin_skills_dir: Optional[Path] = None):
+    def __init__(
+        self,
+        workspace: Path,
+        builtin_skills_dir: Optional[Path] = None,
+        probe: Optional[DependencyProbe] = None,
+    ):
         """
         Initialize SkillsLoader
 
         Args:
             workspace: Path to workspace directory
             builtin_skills_dir: Path to builtin skills directory (default: agent/skills)
+            probe: Dependency probe shared across loaders (default: a new DependencyProbe)
         """
         self.workspace = workspace
         self.workspace_skills = workspace / "skills"
@@ -29,6 +36,53 @@ class SkillsLoader:
         # Create workspace skills directory if it doesn't exist
         self.workspace_skills.mkdir(parents=True, exist_ok=True)
 
+        # 技能目录缓存：元数据只解析一次，目录 mtime 变化或调用 invalidate() 时重建
+        self._lock = threading.Lock()
+        self._catalogue: Optional[Dict[str, Dict]] = None
+        self._signature: Optional[tuple] = None
+        self._watched: List[Path] = []
+        self._summary: Optional[str] = None
+        self._summary_generation: Optional[int] = None
+
+        # 依赖探测在进程内完成并带 TTL 缓存，不再为每个依赖 fork `which`
+        self.probe = probe or DependencyProbe()
+
+    def invalidate(self) -> None:
+        """Drop the cached catalogue (e.g. from a filesystem watcher)"""
+        with self._lock:
+            self._signature = None
+
+    def _compute_signature(self) -> tuple:
+        """Stat the skill roots, skill directories and SKILL.md files (no reads)"""
+        signature = []
+        for path in self._watched:
+            try:
+                signature.append(path.stat().st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _get_catalogue(self) -> Dict[str, Dict]:
+        """Return the cached catalogue, rebuilding it if any skill directory changed"""
+        if self._signature is not None and self._compute_signature() == self._signature:
+            return self._catalogue
+
+        with self._lock:
+            if self._signature is not None and self._compute_signature() == self._signature:
+                return self._catalogue
+
+            catalogue = self._scan_skills()
+
+            watched = [self.builtin_skills, self.workspace_skills]
+            for skill in catalogue.values():
+                skill_file = Path(skill["path"])
+                watched.extend([skill_file.parent, skill_file])
+            self._watched = watched
+            self._catalogue = catalogue
+            self._summary = None
+            self._signature = self._compute_signature()
+            return catalogue
+
     def list_skills(self, filter_unavailable: bool = True) -> List[Dict[str, str]]:
         """
         List all available skills
@@ -39,6 +93,29 @@ class SkillsLoader:
         Returns:
             List of skill metadata dicts
         """
+        skills = self._get_catalogue()
+
+        # Filter unavailable skills
+        if filter_unavailable:
+            return [dict(skill) for skill in skills.values() if self._check_skill_available(skill)]
+
+        return [dict(skill) for skill in skills.values()]
+
+    def get_skill(self, name: str) -> Optional[Dict]:
+        """
+        Get skill metadata by name from the cached catalogue
+
+        Args:
+            name: Skill name
+
+        Returns:
+            Skill metadata dict or None if not found
+        """
+        skill = self._get_catalogue().get(name)
+        return dict(skill) if skill else None
+
+    def _scan_skills(self) -> Dict[str, Dict]:
+        """Walk both skill directories and parse every SKILL.md"""
         skills = {}
 
         # Load builtin skills first
@@ -69,15 +146,7 @@ class SkillsLoader:
                                 "path": str(skill_file)
                             }
 
-        # Filter unavailable skills
-        if filter_unavailable:
-            available_skills = {}
-            for name, skill in skills.items():
-                if self._check_skill_available(skill):
-                    available_skills[name] = skill
-            return list(available_skills.values())
-
-        return list(skills.values())
+        return skills
 
     def load_skill(self, name: str) -> Optional[str]:
         """
@@ -136,8 +205,23 @@ class SkillsLoader:
         Returns:
             XML-formatted skills summary
         """
-        skills = self.list_skills(filter_unavailable=False)
+        skills = self._get_catalogue()
+        # 依赖探测结果过期或被刷新后重新渲染
+        generation = self.probe.generation
+        with self._lock:
+            if self._summary is not None and self._summary_generation == generation:
+                return self._summary
+
+        summary = self._render_summary(list(skills.values()))
+        with self._lock:
+            # 渲染期间目录被重建（_catalogue 已换成新对象）时不缓存，避免旧摘要覆盖新目录
+            if self._catalogue is skills:
+                self._summary = summary
+                self._summary_generation = generation
+        return summary
 
+    def _render_summary(self, skills: List[Dict]) -> str:
+        """Render the XML skills summary"""
         summary = "<skills>\n"
         for skill in skills:
             available = self._check_skill_available(skill)
@@ -269,51 +353,12 @@ class SkillsLoader:
 
     def _check_skill_available(self, skill: Dict) -> bool:
         """Check if skill dependencies are available"""
-        # Check CLI tools
-        requires_bins = skill.get("requires_bins", "").split(",")
-        for bin_name in requires_bins:
-            bin_name = bin_name.strip()
-            if bin_name and not self._check_command_exists(bin_name):
-                return False
-
-        # Check environment variables
-        requires_env = skill.get("requires_env", "").split(",")
-        for env_var in requires_env:
-            env_var = env_var.strip()
-            if env_var and not os.getenv(env_var):
-                return False
-
-        return True
+        return not self._get_missing_requirements(skill)
 
     def _get_missing_requirements(self, skill: Dict) -> List[str]:
         """Get list of missing requirements"""
-        missing = []
-
-        # Check CLI tools
-        requires_bins = skill.get("requires_bins", "").split(",")
-        for bin_name in requires_bins:
-            bin_name = bin_name.strip()
-            if bin_name and not self._check_command_exists(bin_name):
-                missing.append(f"bin:{bin_name}")
-
-        # Check environment variables
-        requires_env = skill.get("requires_env", "").split(",")
-        for env_var in requires_env:
-            env_var = env_var.strip()
-            if env_var and not os.getenv(env_var):
-                missing.append(f"env:{env_var}")
-
-        return missing
-
-    @staticmethod
-    def _check_command_exists(command: str) -> bool:
+        return self.probe.missing(skill.get("requires_bins", ""), skill.get("requires_env", ""))
+
+    def _check_command_exists(self, command: str) -> bool:
         """Check if a command exists in PATH"""
-        try:
-            subprocess.run(
-                ["which", command],
-                capture_output=True,
-                timeout=1
-            )
-            return True
-        except Exception:
-            return False
+        return self.probe.has_binary(command)
@@ -0,0 +1,312 @@
+"""SQLite-backed memory store with the same API as MemoryManager."""
+
+import os
+import re
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime
+
+from agent.core.memory_manager import MemoryManager
+
+# fsync 策略对应的 SQLite synchronous 级别
+SYNCHRONOUS_LEVELS = {"always": "FULL", "interval": "NORMAL", "never": "OFF"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    session TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (session, key)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_steps_session_time ON steps (session, created_at);
+CREATE TABLE IF NOT EXISTS compressions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    compression_num INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    archive_path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_compressions_session_time ON compressions (session, created_at);
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archives_session_time ON archives (session, created_at);
+CREATE INDEX IF NOT EXISTS idx_archives_time ON archives (created_at);
+"""
+
+ARCHIVE_NAME_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})-(\d{2})_历史\.md$")
+
+
+class SQLiteMemoryManager(MemoryManager):
+    """
+    Memory manager that stores steps, compressions and archives as SQLite rows.
+
+    The database runs in WAL mode with indexes on session and timestamp, so
+    reads and appends stay cheap as history grows. Archives are also written
+    as markdown files so the paths in accumulated compression remain readable.
+    """
+
+    def __init__(
+        self,
+        memory_dir: str | None = None,
+        fsync_policy: str | None = None,
+        fsync_interval: float | None = None,
+        session: str = "default",
+    ):
+        """
+        Initialize SQLite memory manager.
+
+        Args:
+            memory_dir: Path to memory directory. If None, uses default Memory folder.
+            fsync_policy: One of "always", "interval", "never" (mapped to PRAGMA synchronous).
+            fsync_interval: Unused by this backend; accepted for API compatibility.
+            session: Session key used to namespace rows.
+        """
+        if memory_dir is None:
+            memory_dir = str(Path(__file__).parent.parent.parent / "Memory")
+
+        self.session = session
+        self.db_file = Path(memory_dir) / "memory.db"
+        self._db_lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+        Path(memory_dir).mkdir(parents=True, exist_ok=True)
+        self._connect(fsync_policy)
+
+        super().__init__(memory_dir, fsync_policy, fsync_interval)
+
+    # ========== Connection ==========
+
+    def _connect(self, fsync_policy: str | None = None) -> None:
+        """Open the database in WAL mode and create the schema."""
+        policy = (fsync_policy or os.getenv("MEMORY_FSYNC", "interval")).lower()
+        conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS_LEVELS.get(policy, 'NORMAL')}")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._conn = conn
+
+    def close(self) -> None:
+        """Flush pending writes and close the database."""
+        super().close()
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _execute(self, sql: str, params: tuple = ()) -> list[tuple]:
+        """Execute a statement and commit."""
+        with self._db_lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall()
+            self._conn.commit()
+            return rows
+
+    # ========== Accumulated compression ==========
+
+    def load_accumulated_compression(self) -> str:
+        """Load accumulated compression."""
+        rows = self._execute(
+            "SELECT value FROM kv WHERE session = ? AND key = 'accumulated_compression'",
+            (self.session,),
+        )
+        return rows[0][0] if rows else ""
+
+    def save_accumulated_compression(self, compression: str) -> None:
+        """Save accumulated compression."""
+        self._execute(
+            "INSERT OR REPLACE INTO kv (session, key, value) VALUES (?, 'accumulated_compression', ?)",
+            (self.session, compression),
+        )
+
+    def load_compression_tiers(self) -> list[dict]:
+        """Load tiered compression entries (newest first)."""
+        rows = self._execute(
+            "SELECT value FROM kv WHERE session = ? AND key = 'compression_tiers'",
+            (self.session,),
+        )
+        return json.loads(rows[0][0]) if rows else []
+
+    def save_compression_tiers(self, entries: list[dict]) -> None:
+        """Save tiered compression entries (newest first)."""
+        self._execute(
+            "INSERT OR REPLACE INTO kv (session, key, value) VALUES (?, 'compression_tiers', ?)",
+            (self.session, json.dumps(entries, ensure_ascii=False)),
+        )
+
+    # ========== Archives ==========
+
+    def save_compression_archive(self, compression_content: str) -> str:
+        """
+        Save compression archive as a row (and a markdown file for file_read).
+
+        Returns:
+            The relative path of the archive inside the Memory folder.
+        """
+        archive_path = super().save_compression_archive(compression_content)
+        self._execute(
+            "INSERT OR REPLACE INTO archives (session, created_at, path, body) VALUES (?, ?, ?, ?)",
+            (self.session, datetime.now().isoformat(), archive_path, compression_content),
+        )
+        return archive_path
+
+    def load_compression_archive(self, archive_path: str) -> str | None:
+        """Load an archive body by its relative path."""
+        rows = self._execute("SELECT body FROM archives WHERE path = ?", (archive_path,))
+        return rows[0][0] if rows else None
+
+    # ========== Execution history ==========
+
+    def _read_execution_history_file(self) -> list[str]:
+        """Load execution history rows for this session (startup only)."""
+        rows = self._execute(
+            "SELECT content FROM steps WHERE session = ? ORDER BY id",
+            (self.session,),
+        )
+        return [line for (content,) in rows for line in content.split('\n') if line.strip()]
+
+    def _apply_writes(self, batch: list[tuple[str, list[str]]]) -> None:
+        """Apply a batch of queued history writes in one transaction."""
+        now = datetime.now().isoformat()
+        with self._db_lock:
+            with self._conn:
+                for op, entries in batch:
+                    if op == "rewrite":
+                        self._conn.execute("DELETE FROM steps WHERE session = ?", (self.session,))
+                    self._conn.executemany(
+                        "INSERT INTO steps (session, created_at, content) VALUES (?, ?, ?)",
+                        [(self.session, now, entry) for entry in entries],
+                    )
+
+    # ========== Index ==========
+
+    def load_index(self) -> dict:
+        """Load index of all memories."""
+        rows = self._execute(
+            "SELECT compression_num, created_at, summary, archive_path FROM compressions "
+            "WHERE session = ? ORDER BY id",
+            (self.session,),
+        )
+        return {
+            "compressions": [
+                {
+                    "compression_num": num,
+                    "timestamp": created_at,
+                    "summary": summary,
+                    "archive_path": archive_path,
+                }
+                for num, created_at, summary, archive_path in rows
+            ]
+        }
+
+    def save_index(self, index: dict) -> None:
+        """Replace the index of all memories."""
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM compressions WHERE session = ?", (self.session,))
+                for entry in index.get("compressions", []):
+                    self._insert_compression(entry)
+
+    def add_compression_entry(self, compression_num: int, summary: str, archive_path: str) -> None:
+        """Add a new compression entry to the index (single row insert)."""
+        with self._db_lock:
+            with self._conn:
+                self._insert_compression({
+                    "compression_num": compression_num,
+                    "timestamp": datetime.now().isoformat(),
+                    "summary": summary[:100] + "..." if len(summary) > 100 else summary,
+                    "archive_path": archive_path,
+                })
+
+    def _insert_compression(self, entry: dict) -> None:
+        """Insert one compression row (caller holds the transaction)."""
+        self._conn.execute(
+            "INSERT INTO compressions (session, compression_num, created_at, summary, archive_path) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                self.session,
+                entry.get("compression_num", 0),
+                entry.get("timestamp") or datetime.now().isoformat(),
+                entry.get("summary", ""),
+                entry.get("archive_path", ""),
+            ),
+        )
+
+    # ========== Maintenance ==========
+
+    def clear_all(self) -> None:
+        """Clear all memory rows and archive files."""
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+            self._conn = None
+            super().clear_all()
+            self._connect(self.fsync_policy)
+
+    def migrate_from_files(self) -> dict:
+        """
+        Import the file-based Memory layout into the database.
+
+        Reads accumulated_compression.md, execution_history.md, index.json and
+        the per-day *_历史.md archives. Archives already imported are skipped,
+        so the migration can be re-run safely.
+
+        Returns:
+            Counts of imported items.
+        """
+        counts = {"compression": 0, "steps": 0, "index_entries": 0, "archives": 0}
+
+        if self.compression_file.exists():
+            compression = self.compression_file.read_text(encoding='utf-8')
+            if compression.strip() and not self.load_accumulated_compression():
+                self.save_accumulated_compression(compression)
+                counts["compression"] = 1
+
+        if self.execution_history_file.exists() and not self.load_execution_history():
+            history = MemoryManager._read_execution_history_file(self)
+            if history:
+                self.save_execution_history(history)
+                self.flush()
+                counts["steps"] = len(history)
+
+        if self.index_file.exists() and not self.load_index()["compressions"]:
+            try:
+                content = self.index_file.read_text(encoding='utf-8').strip()
+                entries = json.loads(content).get("compressions", []) if content else []
+            except json.JSONDecodeError:
+                entries = []
+            if entries:
+                self.save_index({"compressions": entries})
+                counts["index_entries"] = len(entries)
+
+        for archive_file in sorted(self.memory_dir.glob("*/*_历史.md")):
+            relative_path = str(archive_file.relative_to(self.memory_dir))
+            match = ARCHIVE_NAME_PATTERN.match(archive_file.name)
+            if match:
+                date, hour, minute, second = match.groups()
+                created_at = f"{date}T{hour}:{minute}:{second}"
+            else:
+                created_at = datetime.fromtimestamp(archive_file.stat().st_mtime).isoformat()
+
+            with self._db_lock:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO archives (session, created_at, path, body) VALUES (?, ?, ?, ?)",
+                        (self.session, created_at, relative_path, archive_file.read_text(encoding='utf-8')),
+                    )
+            counts["archives"] += cursor.rowcount
+
+        return counts
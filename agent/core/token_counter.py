@@ -0,0 +1,87 @@
+"""Pluggable token counters for memory accounting."""
+
+import os
+import re
+
+# tiktoken 为可选依赖：安装后使用离线 BPE 分词，否则退回启发式估算
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# 一次扫描同时匹配汉字和英文单词
+TOKEN_PATTERN = re.compile(r"([\u4e00-\u9fff])|([a-zA-Z]+)")
+
+
+class HeuristicTokenCounter:
+    """
+    Coefficient-based token estimate (no dependencies).
+
+    - 中文：1 汉字 ≈ 1.7 token
+    - 英文：1 单词 ≈ 1.9 token
+    - 其他字符：2.5 字符 ≈ 1 token
+    """
+
+    name = "heuristic"
+    overhead = 200  # baseline 和格式开销，每次估算只加一次
+
+    def count(self, text: str) -> int:
+        """Count tokens of a text (without overhead)."""
+        chinese_chars = 0
+        english_words = 0
+        word_chars = 0
+        for match in TOKEN_PATTERN.finditer(text):
+            if match.group(1):
+                chinese_chars += 1
+            else:
+                english_words += 1
+                word_chars += len(match.group(2))
+        other_chars = len(text) - chinese_chars - word_chars
+        return round(chinese_chars * 1.7 + english_words * 1.9 + other_chars / 2.5)
+
+
+class TiktokenCounter:
+    """Exact BPE token count via tiktoken."""
+
+    name = "tiktoken"
+    overhead = 0
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        """
+        Initialize tiktoken counter.
+
+        Args:
+            encoding: tiktoken encoding name.
+        """
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        """Count tokens of a text."""
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def create_token_counter(kind: str | None = None):
+    """
+    Create the configured token counter.
+
+    Args:
+        kind: "auto", "tiktoken" or "heuristic" (default: TOKEN_COUNTER env or "auto").
+
+    Returns:
+        A counter exposing count(text) and overhead.
+    """
+    kind = (kind or os.getenv("TOKEN_COUNTER", "auto")).lower()
+    if kind not in ("auto", "tiktoken", "heuristic"):
+        raise ValueError(f"Unknown token counter '{kind}', expected auto, tiktoken or heuristic")
+
+    if kind != "heuristic" and TIKTOKEN_AVAILABLE:
+        try:
+            return TiktokenCounter(os.getenv("TOKENIZER_ENCODING", "cl100k_base"))
+        except Exception as e:
+            # 编码文件不可用（如离线且未缓存）时退回启发式估算
+            print(f"⚠️  tiktoken 编码加载失败，使用估算计数: {e}")
+    elif kind == "tiktoken":
+        print("⚠️  未安装 tiktoken，使用估算计数")
+
+    return HeuristicTokenCounter()
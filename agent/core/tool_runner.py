@@ -0,0 +1,162 @@
+"""Run tools off the event loop: blocking tools in threads, CPU-heavy tools in processes"""
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from agent.core.extended_tool_executor import execute_isolated
+
+# PDF/docx 解析和生成是 CPU 密集型任务，放到进程池，避免占用 GIL
+PROCESS_TOOLS = {"read_pdf", "generate_pdf"}
+
+# 每个工具同时执行的上限（可用 TOOL_CONCURRENCY 覆盖，如 "shell=4,read_pdf=2"）
+DEFAULT_TOOL_LIMITS = {
+    "shell": 4,
+    "read_url": 4,
+    "web_search": 4,
+    "read_pdf": 2,
+    "generate_pdf": 2,
+}
+
+CANCELLED_RESULT = "⏹️ 工具执行已取消"
+
+
+def parse_tool_limits(spec: str) -> Dict[str, int]:
+    """Parse "tool=limit,tool=limit" into a dict"""
+    limits = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        if name.strip() and value.strip().isdigit():
+            limits[name.strip()] = max(int(value), 1)
+    return limits
+
+
+def _task_cancelling() -> bool:
+    """True if the current task has a pending cancel() request"""
+    task = asyncio.current_task()
+    cancelling = getattr(task, "cancelling", None)  # Python 3.11+
+    return bool(cancelling and cancelling())
+
+
+class ToolRunner:
+    """Bounded worker pools for tool execution, returning awaitables"""
+
+    def __init__(
+        self,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        tool_limits: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Initialize ToolRunner
+
+        Args:
+            thread_workers: Thread pool size for blocking tools (default: TOOL_THREAD_WORKERS or 8)
+            process_workers: Process pool size for CPU-heavy tools (default: TOOL_PROCESS_WORKERS or 2)
+            tool_limits: Per-tool concurrency limits (default: DEFAULT_TOOL_LIMITS plus TOOL_CONCURRENCY)
+        """
+        self.thread_workers = thread_workers or int(os.getenv("TOOL_THREAD_WORKERS", "8"))
+        self.process_workers = process_workers or int(os.getenv("TOOL_PROCESS_WORKERS", "2"))
+        if tool_limits is None:
+            tool_limits = {**DEFAULT_TOOL_LIMITS, **parse_tool_limits(os.getenv("TOOL_CONCURRENCY", ""))}
+        self.tool_limits = tool_limits
+
+        self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="tool")
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._processes_lock = threading.Lock()
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # owner -> 正在执行的 future；cancel(owner) 时取消并返回 CANCELLED_RESULT
+        self._inflight: Dict[int, set] = {}
+        self._cancelled: set = set()
+
+    @property
+    def processes(self) -> ProcessPoolExecutor:
+        """Process pool, created on first use (spawn start method)"""
+        if self._processes is None:
+            with self._processes_lock:
+                if self._processes is None:
+                    # 使用 spawn，避免在多线程进程中 fork
+                    self._processes = ProcessPoolExecutor(
+                        max_workers=self.process_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+        return self._processes
+
+    def _semaphore(self, tool_name: str) -> Optional[asyncio.Semaphore]:
+        """Get the concurrency limit for a tool (None if unlimited)"""
+        limit = self.tool_limits.get(tool_name)
+        if limit is None:
+            return None
+        if tool_name not in self._semaphores:
+            self._semaphores[tool_name] = asyncio.Semaphore(limit)
+        return self._semaphores[tool_name]
+
+    async def run(self, tool_executor, tool_call: Dict[str, Any], owner: Any = None) -> str:
+        """
+        Execute a tool call in the matching pool
+
+        Args:
+            tool_executor: ExtendedToolExecutor used for thread-pool tools
+            tool_call: {"tool": name, "params": {...}}
+            owner: Object the call belongs to (used by cancel)
+
+        Returns:
+            Tool result string, or CANCELLED_RESULT if cancelled
+        """
+        tool_name = tool_call.get("tool")
+        semaphore = self._semaphore(tool_name)
+        if semaphore is not None:
+            await semaphore.acquire()
+
+        loop = asyncio.get_running_loop()
+        try:
+            if tool_name in PROCESS_TOOLS:
+                # 子进程的工作目录与当前进程保持一致（dir_change 之后也正确）
+                future = loop.run_in_executor(self.processes, execute_isolated, tool_call, os.getcwd())
+            else:
+                future = loop.run_in_executor(self._threads, tool_executor.execute, tool_call)
+
+            inflight = self._inflight.setdefault(id(owner), set())
+            inflight.add(future)
+            try:
+                return await future
+            except asyncio.CancelledError:
+                # 只有 cancel(owner) 取消的调用返回 CANCELLED_RESULT；所在任务本身被取消时继续抛出
+                if future in self._cancelled and not _task_cancelling():
+                    return CANCELLED_RESULT
+                raise
+            finally:
+                inflight.discard(future)
+                self._cancelled.discard(future)
+                if not inflight:
+                    self._inflight.pop(id(owner), None)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def cancel(self, owner: Any = None) -> int:
+        """
+        Cancel the in-flight tool calls of an owner
+
+        Calls still queued never start; calls already running finish in the
+        background and their result is discarded.
+
+        Returns:
+            Number of cancelled calls
+        """
+        futures = self._inflight.get(id(owner), set())
+        for future in futures:
+            self._cancelled.add(future)
+            future.cancel()
+        return len(futures)
+
+    def shutdown(self) -> None:
+        """Shut down both pools"""
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
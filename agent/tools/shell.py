@@ -1,7 +1,9 @@
 """Shell execution tool"""
 import subprocess
 import os
+import signal
 import platform
+import threading
 from typing import Dict, Any, Tuple, Optional
 from dataclasses import dataclass
 
@@ -21,6 +23,8 @@ class ShellTool:
     def __init__(self, max_output_length: int = 5000):
         self.max_output_length = max_output_length
         self.last_result: Optional[CommandResult] = None
+        self._running: set = set()  # 正在执行的子进程（/stop 时终止）
+        self._running_lock = threading.Lock()
 
     def execute(self, command: str, cwd: Optional[str] = None) -> CommandResult:
         """Execute a shell command safely"""
@@ -49,35 +53,46 @@ class ShellTool:
                         success=False
                     )
 
-            result = subprocess.run(
+            # 独立进程组，终止时连同 shell 启动的子进程一起结束
+            process = subprocess.Popen(
                 command,
                 shell=True,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
                 text=True,
-                timeout=30,
-                cwd=cwd or os.getcwd()
+                cwd=cwd or os.getcwd(),
+                start_new_session=platform.system() != 'Windows',
             )
-
-            stdout = result.stdout[:self.max_output_length]
-            stderr = result.stderr[:self.max_output_length]
+            with self._running_lock:
+                self._running.add(process)
+            try:
+                stdout, stderr = process.communicate(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._terminate(process)
+                process.communicate()
+                return CommandResult(
+                    returncode=1,
+                    stdout="",
+                    stderr="Command timeout (30s)",
+                    success=False
+                )
+            finally:
+                with self._running_lock:
+                    self._running.discard(process)
+
+            stdout = stdout[:self.max_output_length]
+            stderr = stderr[:self.max_output_length]
 
             cmd_result = CommandResult(
-                returncode=result.returncode,
+                returncode=process.returncode,
                 stdout=stdout,
                 stderr=stderr,
-                success=result.returncode == 0
+                success=process.returncode == 0
             )
 
             self.last_result = cmd_result
             return cmd_result
 
-        except subprocess.TimeoutExpired:
-            return CommandResult(
-                returncode=1,
-                stdout="",
-                stderr="Command timeout (30s)",
-                success=False
-            )
         except Exception as e:
             return CommandResult(
                 returncode=1,
@@ -86,6 +101,25 @@ class ShellTool:
                 success=False
             )
 
+    @staticmethod
+    def _terminate(process: subprocess.Popen) -> None:
+        """Kill a command and the processes it started"""
+        try:
+            if platform.system() != 'Windows':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+
+    def kill_running(self) -> int:
+        """Kill all running commands (used by /stop), returns how many were killed"""
+        with self._running_lock:
+            processes = list(self._running)
+        for process in processes:
+            self._terminate(process)
+        return len(processes)
+
     def get_current_dir(self) -> str:
         """Get current working directory"""
         return os.getcwd()
@@ -1,18 +1,30 @@
 """Skill loading tool - allows AI to load skill content on demand"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
 
 
 class SkillTool:
     """Tool for loading skill content"""
 
-    def __init__(self, skills_loader):
+    def __init__(self, skills_loader, cache_size: int = 32):
         """
         Initialize SkillTool
 
         Args:
             skills_loader: SkillsLoader instance
+            cache_size: Maximum number of loaded skill bundles kept in the LRU cache
         """
         self.skills_loader = skills_loader
 
+        # 技能包（内容 + 脚本列表 + 目录结构）LRU 缓存，键为 (目录, SKILL.md 与所列目录的 mtime 签名)
+        self.cache_size = cache_size
+        self._bundles: OrderedDict[tuple, str] = OrderedDict()
+        self._bundles_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     def load_skill(self, skill_name: str) -> tuple[bool, str]:
         """
         Load a skill's complete content with file structure
@@ -25,28 +37,64 @@ class SkillTool:
         """
         try:
             # Check if skill exists
-            available_skills = self.skills_loader.list_skills(filter_unavailable=False)
-            skill_names = [s['name'] for s in available_skills]
-
-            if skill_name not in skill_names:
+            skill = self.skills_loader.get_skill(skill_name)
+            if skill is None:
+                skill_names = [s['name'] for s in self.skills_loader.list_skills(filter_unavailable=False)]
                 return False, f"❌ Skill '{skill_name}' not found. Available skills: {', '.join(skill_names)}"
 
             # Check if skill is available (dependencies met)
-            skill = next((s for s in available_skills if s['name'] == skill_name), None)
             if not self.skills_loader._check_skill_available(skill):
                 missing = self.skills_loader._get_missing_requirements(skill)
                 return False, f"❌ Skill '{skill_name}' is unavailable. Missing: {', '.join(missing)}"
 
-            # Load skill content
-            content = self.skills_loader.load_skill(skill_name)
-            if not content:
+            # 命中缓存时直接返回已构建的技能包
+            skill_file = Path(skill['path'])
+            skill_dir = skill_file.parent
+            key = (str(skill_dir), self._bundle_signature(skill_dir))
+            with self._bundles_lock:
+                bundle = self._bundles.get(key)
+                if bundle is not None:
+                    self._bundles.move_to_end(key)
+                    self.cache_hits += 1
+                    return True, bundle
+                self.cache_misses += 1
+
+            bundle = self._build_bundle(skill_name, skill_dir)
+            if bundle is None:
                 return False, f"❌ Failed to load skill '{skill_name}'"
 
-            # Get skill directory and list files
-            skill_dir = self.skills_loader._find_skill_dir(skill_name)
-            file_structure = self._get_file_structure(skill_dir)
+            with self._bundles_lock:
+                # 丢弃同一技能的旧版本
+                for stale_key in [k for k in self._bundles if k[0] == key[0]]:
+                    del self._bundles[stale_key]
+                self._bundles[key] = bundle
+                while len(self._bundles) > self.cache_size:
+                    self._bundles.popitem(last=False)
+
+            return True, bundle
 
-            return True, f"""✅ Loaded skill: {skill_name}
+        except Exception as e:
+            return False, f"❌ Error loading skill: {str(e)}"
+
+    def _build_bundle(self, skill_name: str, skill_dir: Path) -> str | None:
+        """
+        Build the loaded skill text (content, scripts section and file tree)
+
+        Args:
+            skill_name: Name of the skill
+            skill_dir: Path to skill directory
+
+        Returns:
+            Formatted skill bundle or None if the content could not be loaded
+        """
+        # Load skill content
+        content = self.skills_loader.load_skill(skill_name)
+        if not content:
+            return None
+
+        file_structure = self._get_file_structure(skill_dir)
+
+        return f"""✅ Loaded skill: {skill_name}
 
 ## 📁 Skill 目录结构
 
@@ -56,8 +104,29 @@ class SkillTool:
 
 {content}"""
 
-        except Exception as e:
-            return False, f"❌ Error loading skill: {str(e)}"
+    @staticmethod
+    def _bundle_signature(skill_dir: Path) -> tuple:
+        """
+        Signature of exactly what a skill bundle renders
+
+        The bundle holds SKILL.md's content plus the names listed in
+        skill_dir and in its direct subdirectories (scripts section and file
+        tree), so SKILL.md's mtime/size and those directories' mtimes cover
+        it. Only one directory is listed, nothing deeper is walked.
+        """
+        skill_file = os.stat(skill_dir / "SKILL.md")
+        with os.scandir(skill_dir) as items:
+            subdirs = sorted((item.name, item.stat().st_mtime_ns) for item in items if item.is_dir())
+        return skill_file.st_mtime_ns, skill_file.st_size, os.stat(skill_dir).st_mtime_ns, tuple(subdirs)
+
+    def get_cache_stats(self) -> dict:
+        """Get skill bundle cache metrics"""
+        with self._bundles_lock:
+            return {
+                "entries": len(self._bundles),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+            }
 
     def _get_file_structure(self, skill_dir) -> str:
         """
@@ -70,8 +139,6 @@ class SkillTool:
             Formatted file structure string
         """
         try:
-            from pathlib import Path
-
             if not skill_dir or not skill_dir.exists():
                 return "无法获取文件结构"
 
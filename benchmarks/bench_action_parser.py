@@ -0,0 +1,143 @@
+"""Micro-benchmark: JSON action extraction from AI responses
+
+Compares the single-pass ActionExtractor with the previous parser (regex
+rewrites, then json.loads on every prefix ending in "}" from the back) on
+the malformed responses in malformed_responses.jsonl, and on generated
+responses with a large HTML "content" param.
+
+A parser is "ok" on a case when its result equals the case's "expected"
+value (null for responses that must not yield an action, such as a
+truncated one), not merely when it returns something.
+
+Usage:
+    python benchmarks/bench_action_parser.py [--sizes 10000,50000,100000] [--repeat 5]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from agent.core.action_parser import ActionExtractor, extract_action  # noqa: E402
+
+CORPUS = Path(__file__).parent / "malformed_responses.jsonl"
+
+
+def legacy_parse(response: str):
+    """The parser ActionExtractor replaced (one attempt, without logging)"""
+    start_marker = "===== JSON START ====="
+    end_marker = "===== JSON END ====="
+    start_idx = response.find(start_marker)
+    end_idx = response.find(end_marker)
+    if start_idx >= 0 and end_idx > start_idx:
+        json_str = response[start_idx + len(start_marker):end_idx].strip()
+    else:
+        start_idx = response.find("{")
+        end_idx = response.rfind("}") + 1
+        if start_idx < 0 or end_idx <= start_idx:
+            return None
+        json_str = response[start_idx:end_idx]
+
+    json_str = json_str.replace("\n", " ").replace("\r", "")
+    if json_str.startswith("```"):
+        json_str = json_str[3:]
+    if json_str.endswith("```"):
+        json_str = json_str[:-3]
+    json_str = json_str.strip()
+
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    json_str = re.sub(
+        r'("content"\s*:\s*")((?:[^"\\]|\\.)*?)(")',
+        lambda m: m.group(1) + m.group(2).replace('"', '\\"') + m.group(3),
+        json_str,
+        flags=re.DOTALL,
+    )
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    json_str = re.sub(r'(?<=[a-zA-Z0-9])"(?=[a-zA-Z0-9=])', '\\"', json_str)
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        pass
+    for i in range(len(json_str) - 1, 0, -1):
+        if json_str[i] == "}":
+            try:
+                return json.loads(json_str[:i + 1])
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+def large_html_response(size: int) -> tuple:
+    """A file_write action with a large HTML page and one unescaped attribute near the end
+
+    The old parser only fails at that quote, so each of its fallback
+    json.loads calls re-parses almost the whole page. Returns (response, expected action).
+    """
+    block = "<style>.card { color: red; }</style><script>if (x) { log(1); }</script><p>text</p>\n"
+    html = block * max(size // len(block), 1) + '<div title="main page">end</div>'
+    params = {"path": "workspace/output/index.html", "content": html}
+    response = (
+        "接下来我要: 创建网页\n===== JSON START =====\n"
+        '{"action": "execute_tool", "tool": "file_write", "params": '
+        '{"path": "' + params["path"] + '", "content": "' + html + '"}}'
+        "\n===== JSON END ====="
+    )
+    return response, {"action": "execute_tool", "tool": "file_write", "params": params}
+
+
+def timeit(func, text: str, repeat: int) -> float:
+    """Best wall time of func(text) in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def streamed(text: str, chunk: int = 16):
+    """Feed text to an extractor in small chunks, as a stream would"""
+    extractor = ActionExtractor()
+    for i in range(0, len(text), chunk):
+        extractor.feed(text[i:i + chunk])
+    return extractor.finish()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,50000,100000", help="HTML content sizes in characters")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"{'case':<24}{'legacy ms':>12}{'new ms':>10}{'stream ms':>11}  legacy ok  new ok")
+    cases = [json.loads(line) for line in CORPUS.read_text(encoding="utf-8").splitlines() if line.strip()]
+    for size in (int(s) for s in args.sizes.split(",")):
+        response, expected = large_html_response(size)
+        cases.append({"name": f"large_html_{size}", "response": response, "expected": expected})
+
+    passed = 0
+    for case in cases:
+        text = case["response"]
+        legacy_ok = legacy_parse(text) == case["expected"]
+        new_ok = extract_action(text) == case["expected"] and streamed(text) == case["expected"]
+        passed += new_ok
+        # 旧解析器在大输入上是平方复杂度，只测一次
+        legacy_ms = timeit(legacy_parse, text, 1 if len(text) > 20000 else args.repeat)
+        new_ms = timeit(extract_action, text, args.repeat)
+        stream_ms = timeit(streamed, text, args.repeat)
+        print(f"{case['name']:<24}{legacy_ms:>12.2f}{new_ms:>10.2f}{stream_ms:>11.2f}"
+              f"  {str(legacy_ok):>9}  {str(new_ok):>6}")
+    print(f"\nnew parser matches expected on {passed}/{len(cases)} cases")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,44 +9,154 @@ import locale
 os.environ['PYTHONIOENCODING'] = 'utf-8'
 locale.setlocale(locale.LC_ALL, '')
 
-from agent.core.ai_engine import AIEngine
+from agent.core.ai_engine import AIEngine, AsyncAIEngine
 from agent.core.extended_tool_executor import ExtendedToolExecutor
 from agent.core.skills import SkillsLoader
-from agent.core.memory_manager import MemoryManager
+from agent.core.memory_manager import create_memory_manager
+from agent.core.compression_tiers import TieredCompression
+from agent.core.session_manager import SessionManager, session_dir_name
+from agent.core.tool_runner import ToolRunner
+from agent.core.prompt_template import PromptTemplate
+from agent.core.action_parser import ActionExtractor
 from agent.bus.queue import MessageBus
 from agent.bus.events import OutboundMessage
 from agent.channels.manager import ChannelManager
 from agent.config.loader import load_config
 import json
 import asyncio
+from enum import Enum
 from pathlib import Path
 
+# 原生工具调用模式（API_TOOL_MODE=native）下追加到系统提示词末尾，覆盖 JSON 输出格式的要求
+NATIVE_TOOL_PROMPT = """
+
+## 工具调用方式（覆盖上文的 JSON 格式要求）
+本次对话通过接口原生的函数调用（tools）执行工具：
+- 需要使用工具时，直接调用对应的函数，不要输出 "===== JSON START =====" 标记或 JSON 动作
+- 多个互不依赖的工具可以在同一次回复中一起调用，它们会并行执行
+- 调用工具时可以附带一两句话说明接下来要做什么
+- 任务完成、不再需要工具时，直接用自然语言给出最终回答，不要调用任何函数"""
+
+
+class StepOutcome(Enum):
+    """Result of one task step, consumed by the step scheduler"""
+    CONTINUE = "continue"  # 继续执行下一步
+    SUSPEND = "suspend"  # 挂起，等待用户确认（resume_after_approval）或定时器触发后恢复
+    DONE = "done"  # 任务结束
+
+
+class StreamForwarder:
+    """Forward the natural-language part of a streamed response incrementally
+
+    Text is buffered and flushed at line breaks (or once it grows past
+    min_chunk characters) until the JSON block marker shows up; everything
+    after the marker is the action and is never forwarded.
+    """
+
+    JSON_MARKER = "===== JSON START ====="
+    PREFIX = "接下来我要:"
+
+    def __init__(self, send, min_chunk: int = 80):
+        self.send = send  # 回调：接收一段自然语言文本
+        self.min_chunk = min_chunk
+        self.buffer = ""
+        self.done = False  # 已遇到 JSON 标记，不再转发
+        self.sent_any = False
+
+    def feed(self, delta: str) -> None:
+        """Consume one streamed delta"""
+        if self.done:
+            return
+        self.buffer += delta
+
+        marker_idx = self.buffer.find(self.JSON_MARKER)
+        if marker_idx >= 0:
+            self._emit(self.buffer[:marker_idx])
+            self.buffer = ""
+            self.done = True
+            return
+
+        # 保留末尾可能是半个标记的内容，等待下一个 delta
+        safe_len = len(self.buffer) - (len(self.JSON_MARKER) - 1)
+        if safe_len <= 0:
+            return
+        newline_idx = self.buffer.rfind("\n", 0, safe_len)
+        if newline_idx >= 0:
+            cut = newline_idx + 1
+        elif safe_len >= self.min_chunk:
+            cut = safe_len
+        else:
+            return
+        self._emit(self.buffer[:cut])
+        self.buffer = self.buffer[cut:]
+
+    def finish(self) -> None:
+        """Flush whatever natural-language text is still buffered"""
+        if not self.done:
+            self._emit(self.buffer)
+        self.buffer = ""
+        self.done = True
+
+    def _emit(self, text: str) -> None:
+        if not self.sent_any:
+            text = text.lstrip()
+            if text.startswith(self.PREFIX):
+                text = text[len(self.PREFIX):]
+        text = text.strip()
+        if not text:
+            return
+        self.send(text if self.sent_any else f"🤖 {text}")
+        self.sent_any = True
+
 
 class NaturalTaskExecutor:
     """Execute tasks with natural conversational flow"""
 
-    def __init__(self, bus: MessageBus | None = None):
-        self.ai_engine = AIEngine()
-
-        # Initialize memory manager
+    def __init__(
+        self,
+        bus: MessageBus | None = None,
+        session_key: str | None = None,
+        skills_loader: SkillsLoader | None = None,
+        prompt_template: PromptTemplate | None = None,
+        tool_runner: ToolRunner | None = None,
+    ):
+        self.ai_engine = AIEngine()  # 同步引擎：后台压缩线程使用
+        self.async_engine = AsyncAIEngine()  # 异步引擎：任务步骤使用，不阻塞事件循环
+        self.session_key = session_key  # 网关会话（如 feishu:oc_xxx），CLI 模式为 None
+
+        # Initialize memory manager（每个网关会话使用独立的记忆目录，放在 Memory 之外，CLI 的 /clear 不会清掉）
         memory_dir = Path(__file__).parent / "Memory"
-        self.memory_manager = MemoryManager(str(memory_dir))
+        if session_key:
+            memory_dir = Path(__file__).parent / "Sessions" / session_dir_name(session_key)
+        self.memory_manager = create_memory_manager(str(memory_dir))
 
-        # Initialize skills loader
-        workspace_path = Path(__file__).parent / "workspace"
-        workspace_path.mkdir(exist_ok=True)
-        self.skills_loader = SkillsLoader(workspace_path)
+        # Initialize skills loader（网关模式下所有会话共享，复用技能目录缓存）
+        if skills_loader is None:
+            workspace_path = Path(__file__).parent / "workspace"
+            workspace_path.mkdir(exist_ok=True)
+            skills_loader = SkillsLoader(workspace_path)
+        self.skills_loader = skills_loader
+
+        # Agent.md 提示词模板：只编译一次，文件修改后自动重新编译
+        self.prompt_template = prompt_template or PromptTemplate(Path(__file__).parent / "Agent.md")
 
         # Initialize tool executor with skills loader
-        self.tool_executor = ExtendedToolExecutor(skills_loader=self.skills_loader)
+        self.tool_executor = ExtendedToolExecutor(skills_loader=self.skills_loader, memory_manager=self.memory_manager)
         self.available_tools = self.tool_executor.get_available_tools()
+        self.tool_schemas = self.tool_executor.get_tool_schemas()  # 原生工具调用模式使用的函数定义
+        # 工具在线程池/进程池中执行，不阻塞事件循环（网关模式下所有会话共享）
+        self.tool_runner = tool_runner or ToolRunner()
+        self.max_parallel_tools = int(os.getenv("MAX_PARALLEL_TOOLS", "4"))  # 批量工具调用的并发上限
 
         self.execution_history = []
         self.step_count = 0
-        self.max_steps = 15  # 改为15步
+        self.max_steps = int(os.getenv("MAX_STEPS", "15"))  # 每个任务的最大步数
         self.allow_all_commands = False  # 是否允许所有命令
         self.timer_triggered = False  # 定时器是否被触发
         self.waiting_for_timer = False  # 是否在等待定时器
+        self._timer_fired = None  # 上一步设置的定时器（触发时完成的 future），由下一步调度前取走
+        self._timer_tasks = set()  # 网关模式下挂起等待定时器的任务（保持引用）
+        self.run_in_session = None  # 网关模式：把协程放回本会话的调度队列（由 SessionManager 限流）
         self.bus = bus  # 消息总线（用于网关模式）
         self.current_sender_id = None  # 当前消息发送者
         self.current_chat_id = None  # 当前聊天 ID
@@ -56,54 +166,108 @@ class NaturalTaskExecutor:
         self.approval_response = None  # 用户的确认响应
         self.pending_decision = None  # 待执行的决策
         self.pending_user_request = None  # 待执行的用户请求
-        self.pending_context = None  # 待执行的上下文
         self.should_stop = False  # 是否应该停止当前任务
         self.web_search_count = 0  # 网络搜索计数
         self.max_web_searches = 3  # 最多搜索 3 次
         self.task_compression_summary = ""  # 当前任务的压缩摘要
-        # 从记忆文件加载累积的压缩摘要
-        self.accumulated_compression = self.memory_manager.load_accumulated_compression()
+        # 分层累积压缩摘要：最近的任务保留原文，较早的由后台线程滚动合并
+        self._summary_engine = None  # 滚动合并专用引擎（懒加载，避免与压缩线程共享对话历史）
+        self.compression_tiers = TieredCompression(
+            self.memory_manager,
+            summarize=self._summarize_compressions,
+            count_tokens=self._estimate_tokens,
+        )
         self.current_task_start_step = 0  # 当前任务的起始步骤
         self.event_loop = None  # 事件循环（仅在网关模式下设置）
+        self._sync_loop = None  # CLI 模式下复用的事件循环（保持异步连接池可用）
+
+    async def aclose(self) -> None:
+        """Release connections and flush memory (used when a gateway session is evicted)"""
+        self.cancel_timers()
+        await self.async_engine.aclose()
+        self.ai_engine.close()
+        if self._summary_engine is not None:
+            self._summary_engine.close()
+        # 关闭前会把排队的执行历史写入磁盘，下次收到消息时从磁盘恢复
+        await asyncio.get_running_loop().run_in_executor(None, self.memory_manager.close)
+
+    def run_sync(self, coro):
+        """Run a coroutine to completion from synchronous (CLI) code"""
+        if self._sync_loop is None:
+            self._sync_loop = asyncio.new_event_loop()
+
+        task = self._sync_loop.create_task(coro)
+        try:
+            return self._sync_loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            # 取消当前任务，保证事件循环可以继续用于下一个任务
+            # should_stop 兜底：即使工具调用吞掉了取消，任务也会在下一步之前停止
+            self.should_stop = True
+            self.cancel_tools()
+            task.cancel()
+            try:
+                self._sync_loop.run_until_complete(task)
+            except (asyncio.CancelledError, Exception):
+                pass
+            finally:
+                self.should_stop = False
+            raise
+
+    def cancel_timers(self) -> None:
+        """Drop tasks suspended on a timer (the timer still prints when it fires)"""
+        for task in self._timer_tasks:
+            task.cancel()
+        self.waiting_for_timer = False
+
+    @property
+    def suspended(self) -> bool:
+        """Whether a task is suspended waiting for an approval or a timer"""
+        return self.waiting_for_approval or bool(self._timer_tasks)
+
+    def cancel_tools(self) -> None:
+        """Cancel this executor's in-flight tool calls and kill running shell commands"""
+        self.tool_runner.cancel(self)
+        self.tool_executor.shell_tool.kill_running()
+
+    @property
+    def accumulated_compression(self) -> str:
+        """Rendered accumulated compression (all tiers, newest first)"""
+        return self.compression_tiers.render()
+
+    def _summarize_compressions(self, texts: list, level: int) -> str | None:
+        """Merge older compression entries into one coarser summary (runs in background thread)"""
+        if self._summary_engine is None:
+            self._summary_engine = AIEngine()
+
+        joined = "\n\n".join(texts)
+        summary_prompt = f"""请将以下较早的任务摘要合并为一份更简短的摘要（第 {level} 层）：
+
+{joined}
 
-    def _estimate_tokens(self, text: str) -> int:
-        """估算文本的token数量（基于实际测试优化）
-
-        根据实际反馈调整的系数：
-        - 中文字符：1个汉字 ≈ 1.6-1.8个token
-        - 英文单词：1个单词 ≈ 1.8-2.0个token
-        - 其他字符：包括标点、空格、特殊符号
-        """
-        import re
-
-        # 分离中文字符、英文单词和其他字符
-        chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
-        text_without_chinese = re.sub(r'[\u4e00-\u9fff]', '', text)
-        english_words = re.findall(r'\b[a-zA-Z]+\b', text_without_chinese)
-        other_chars = len(text) - len(chinese_chars) - sum(len(w) for w in english_words)
-
-        # 基于实际反馈优化的token估算
-        # 中文：1汉字 ≈ 1.7 token
-        chinese_tokens = int(len(chinese_chars) * 1.7)
+要求：
+1. 每个任务保留一行：用户问题 + 关键结果
+2. 必须原样保留所有 "📁 详细内容:" 存档路径行
+3. 删除具体步骤细节，总长度不超过原文的一半
 
-        # 英文：1单词 ≈ 1.9 tokens
-        english_tokens = int(len(english_words) * 1.9)
+摘要："""
 
-        # 其他字符：2.5字符 ≈ 1 token
-        other_tokens = int(other_chars / 2.5) + 200  # 加上baseline和格式开销
+        # 同一批条目的合并结果可复用（滚动合并失败重试时不重复计费）
+        summary = self._summary_engine.call_api(summary_prompt, cacheable=True)
+        self._summary_engine.clear_history()
+        if not summary or not summary.strip() or summary.startswith("API Error:"):
+            return None
+        return summary
 
-        total_tokens = chinese_tokens + english_tokens + other_tokens
-        return max(total_tokens, 1)
+    def _estimate_tokens(self, text: str) -> int:
+        """估算文本的token数量（安装 tiktoken 时为精确计数，否则为系数估算）"""
+        counter = self.memory_manager.token_counter
+        return max(counter.count(text) + counter.overhead, 1)
 
     def _compress_and_notify(self, event_loop=None):
         """在后台线程中执行压缩并通知用户"""
         try:
-            # 压缩前估算token数
-            if self.execution_history:
-                history_text = "\n".join(self.execution_history)
-                tokens_before = self._estimate_tokens(history_text)
-            else:
-                tokens_before = 0
+            # 压缩前的token数（增量维护的累计值）
+            tokens_before = self.memory_manager.history_token_count()
 
             self._compress_current_task_manual()
             print(f"✅ 任务历史已自动压缩 (清除了 {tokens_before} tokens)")
@@ -129,7 +293,7 @@ class NaturalTaskExecutor:
             if self.is_gateway_mode and self.bus and self.current_channel and self.current_chat_id:
                 asyncio.ensure_future(self._send_to_channel(f"⚠️ 压缩失败: {str(e)}"))
 
-    def execute_task(self, user_request: str):
+    async def execute_task(self, user_request: str):
         """Execute task dynamically with natural flow"""
         # Check for clear command
         if user_request.lower().strip() == "/clear":
@@ -147,25 +311,114 @@ class NaturalTaskExecutor:
         # 记录用户请求到记忆文件
         self.memory_manager.append_execution_step(f"【用户请求】{user_request}")
 
-        # Build context from execution history
-        context = self._build_context()
-
         # First step: Decide what to do
         self.step_count = 1
-        self._execute_step(user_request, context)
+        await self._run_steps(user_request)
 
-    def _execute_step(self, user_request: str, context: str):
-        """Execute a single step with natural description"""
-        # 检查是否应该停止任务
-        if self.should_stop:
-            print(f"\n⏹️  任务已停止。\n")
-            self.should_stop = False
+    async def _run_steps(self, user_request: str) -> None:
+        """Run task steps iteratively until the task finishes or is suspended
+
+        Each step rebuilds its context from memory, so only one context is
+        alive at a time no matter how many steps the task takes.
+        """
+        while True:
+            # 如果上一步设置了定时器，先等待其触发
+            timer, self._timer_fired = self._timer_fired, None
+            if timer is not None:
+                if self.run_in_session is not None:
+                    # 网关模式：挂起任务，释放会话锁和并发名额，定时器触发后回到会话队列继续执行
+                    task = asyncio.ensure_future(self._resume_after_timer(timer, user_request))
+                    self._timer_tasks.add(task)
+                    task.add_done_callback(self._timer_tasks.discard)
+                    print("⏳ 任务已挂起，等待定时器触发...\n")
+                    return
+                await self._wait_for_timer(timer)
+
+            # 检查是否应该停止任务
+            if self.should_stop:
+                print(f"\n⏹️  任务已停止。\n")
+                self.should_stop = False
+                return
+
+            if self.step_count > self.max_steps:
+                print(f"\n⚠️  已达到最大步数限制({self.max_steps})，任务停止。\n")
+                return
+
+            outcome = await self._execute_step(user_request)
+            if outcome is not StepOutcome.CONTINUE:
+                return
+            self.step_count += 1
+
+    async def resume_after_approval(self, approval: str) -> None:
+        """Resume a task suspended for approval ("yes", "all" or "no")"""
+        decision = self.pending_decision
+        user_request = self.pending_user_request
+
+        self.waiting_for_approval = False
+        self.approval_response = approval
+        self.pending_decision = None
+        self.pending_user_request = None
+
+        # 批量调用：记录本次确认结果，继续确认剩余调用或执行整批
+        if decision is not None and decision.get("action") == "execute_tools":
+            if approval == "all":
+                self.allow_all_commands = True
+            approvals = decision["approvals"] + [approval != "no"]
+            outcome = await self._run_tool_batch(decision["calls"], approvals, user_request)
+            if outcome is StepOutcome.CONTINUE:
+                self.step_count += 1
+                await self._run_steps(user_request)
             return
 
-        if self.step_count > self.max_steps:
-            print(f"\n⚠️  已达到最大步数限制({self.max_steps})，任务停止。\n")
+        if approval == "no" or decision is None:
             return
 
+        if approval == "all":
+            self.allow_all_commands = True
+
+        # 执行待执行的命令，然后从下一步继续调度
+        await self._handle_tool_execution(decision)
+        self.step_count += 1
+        await self._run_steps(user_request)
+
+    async def _wait_for_timer(self, timer: asyncio.Future) -> None:
+        """Wait (without blocking the event loop) until a pending timer fires"""
+        print("⏳ 等待定时器触发...\n")
+        await timer
+        self.waiting_for_timer = False
+        print("✅ 定时器已触发，继续执行任务\n")
+
+    async def _resume_after_timer(self, timer: asyncio.Future, user_request: str) -> None:
+        """Wait for a timer outside the session, then resume the task through the session queue"""
+        await timer
+        await self.run_in_session(self._resume_steps(user_request))
+
+    async def _resume_steps(self, user_request: str) -> None:
+        """Continue a task suspended on a timer"""
+        self.waiting_for_timer = False
+        print("✅ 定时器已触发，继续执行任务\n")
+        await self._run_steps(user_request)
+
+    def _timer_callback(self, timer: asyncio.Future):
+        """Build the set_timer callback, which runs in the timer thread"""
+        loop = timer.get_loop()
+
+        def fire() -> None:
+            if not timer.done():
+                timer.set_result(None)
+
+        def on_fire() -> None:
+            self.timer_triggered = True
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(fire)
+
+        return on_fire
+
+    async def _execute_step(self, user_request: str) -> StepOutcome:
+        """Execute a single step with natural description"""
+        # Build context from execution history
+        context = self._build_context()
+
         # Get current time
         from agent.tools.time_tool import TimeTool
         current_time = TimeTool.get_current_time()
@@ -186,67 +439,81 @@ class NaturalTaskExecutor:
         cache_path = workspace_path / "cache"
         desktop_path = Path.home() / "Desktop"
 
-        # Build the prompt for this step
-        # 从 Agent.md 读取提示词模板
-        agent_md_path = Path(__file__).parent / "Agent.md"
-
-        # 读取 Agent.md 模板
-        with open(agent_md_path, 'r', encoding='utf-8') as f:
-            agent_template = f.read()
-
-        # 分离系统提示词和用户消息部分
-        # 系统提示词：从开头到【用户任务】之前
-        # 用户消息：从【用户任务】开始
-        split_marker = "【用户任务】"
-        split_idx = agent_template.find(split_marker)
-
-        if split_idx >= 0:
-            system_prompt_template = agent_template[:split_idx]
-            user_message_template = agent_template[split_idx:]
-        else:
-            # 如果找不到分割点，全部作为系统提示词
-            system_prompt_template = agent_template
-            user_message_template = ""
-
-        # 替换系统提示词中的变量
-        system_prompt = system_prompt_template
-        system_prompt = system_prompt.replace('{step_count}', str(self.step_count))
-        system_prompt = system_prompt.replace('{max_steps}', str(self.max_steps))
-        system_prompt = system_prompt.replace('{step_count_minus_1}', str(self.step_count - 1))
-        system_prompt = system_prompt.replace('{steps_remaining}', str(self.max_steps - self.step_count + 1))
-        system_prompt = system_prompt.replace('{accumulated_compression}', self.accumulated_compression if self.accumulated_compression else "这是第一个任务")
-
         # 加载execution_history文件内容
         execution_history_content = self.memory_manager.load_execution_history()
         execution_history_text = "\n".join(execution_history_content) if execution_history_content else "还没有执行任何步骤"
-        system_prompt = system_prompt.replace('{execution_history}', execution_history_text)
-
-        system_prompt = system_prompt.replace('{current_time}', current_time)
-        system_prompt = system_prompt.replace('{web_search_count}', str(self.web_search_count))
-        system_prompt = system_prompt.replace('{max_web_searches}', str(self.max_web_searches))
-        system_prompt = system_prompt.replace('{project_root}', str(project_root))
-        system_prompt = system_prompt.replace('{workspace_path}', str(workspace_path))
-        system_prompt = system_prompt.replace('{builtin_skills_path}', str(builtin_skills_path))
-        system_prompt = system_prompt.replace('{workspace_skills_path}', str(workspace_skills_path))
-        system_prompt = system_prompt.replace('{desktop_path}', str(desktop_path))
-        system_prompt = system_prompt.replace('{output_path}', str(output_path))
-        system_prompt = system_prompt.replace('{temp_path}', str(temp_path))
-        system_prompt = system_prompt.replace('{cache_path}', str(cache_path))
-        system_prompt = system_prompt.replace('{skills_summary}', skills_summary)
-
-        # 替换用户消息中的变量
-        user_message = user_message_template
-        user_message = user_message.replace('{user_request}', user_request)
-        user_message = user_message.replace('{context}', context)
+
+        # Build the prompt for this step
+        # 使用已编译的 Agent.md 模板一次性渲染系统提示词和用户消息
+        # 系统提示词分为稳定前缀（规则、工具、skills、压缩摘要）和每步变化的后缀（步骤、时间、近期历史）
+        system_prefix, system_suffix, user_message = self.prompt_template.render_segments({
+            "step_count": str(self.step_count),
+            "max_steps": str(self.max_steps),
+            "step_count_minus_1": str(self.step_count - 1),
+            "steps_remaining": str(self.max_steps - self.step_count + 1),
+            "accumulated_compression": self.accumulated_compression if self.accumulated_compression else "这是第一个任务",
+            "execution_history": execution_history_text,
+            "current_time": current_time,
+            "web_search_count": str(self.web_search_count),
+            "max_web_searches": str(self.max_web_searches),
+            "project_root": str(project_root),
+            "workspace_path": str(workspace_path),
+            "builtin_skills_path": str(builtin_skills_path),
+            "workspace_skills_path": str(workspace_skills_path),
+            "desktop_path": str(desktop_path),
+            "output_path": str(output_path),
+            "temp_path": str(temp_path),
+            "cache_path": str(cache_path),
+            "skills_summary": skills_summary,
+            "user_request": user_request,
+            "context": context,
+        })
+
+        self.async_engine.last_usage = None
+
+        if self.async_engine.tool_mode == "native":
+            return await self._execute_native_step(
+                user_request, user_message, [system_prefix + NATIVE_TOOL_PROMPT, system_suffix]
+            )
+
+        system_prompt = [system_prefix, system_suffix]
 
         # 调用 API 时分离传递系统提示词和用户消息
-        response = self.ai_engine.call_api(user_message, system_prompt=system_prompt)
+        forwarder = None
+        extractor = None
+        if self.async_engine.stream_enabled:
+            # 流式模式：边接收边打印，并把 JSON 之前的自然语言增量推送到飞书
+            if self.is_gateway_mode:
+                forwarder = StreamForwarder(
+                    lambda text: asyncio.ensure_future(self._send_to_channel(text))
+                )
+
+            # JSON 动作随流式输出增量解析，接收完成时无需再扫描全文
+            extractor = ActionExtractor()
+
+            def on_delta(delta: str) -> None:
+                print(delta, end="", flush=True)
+                extractor.feed(delta)
+                if forwarder:
+                    forwarder.feed(delta)
+
+            response = await self.async_engine.call_api(
+                user_message, system_prompt=system_prompt, stream=True, on_delta=on_delta
+            )
+            print()
+            if forwarder:
+                forwarder.finish()
+        else:
+            response = await self.async_engine.call_api(user_message, system_prompt=system_prompt)
 
-        # 清空AI引擎的对话历史（已保存到执行历史文件）
-        self.ai_engine.clear_history()
+            # 显示AI的回答
+            print(response)
+
+        self._report_prompt_render()
+        self._report_prompt_cache()
 
-        # 显示AI的回答
-        print(response)
+        # 清空AI引擎的对话历史（已保存到执行历史文件）
+        self.async_engine.clear_history()
 
         # 提取自然语言部分
         natural_language = self._extract_natural_language(response)
@@ -255,24 +522,104 @@ class NaturalTaskExecutor:
         if natural_language:
             self.memory_manager.append_execution_step(f"【AI响应】{natural_language}")
 
-        # 发送到飞书
-        if natural_language and self.is_gateway_mode:
+        # 发送到飞书（流式模式下已增量发送）
+        if natural_language and self.is_gateway_mode and forwarder is None:
             # 使用 ensure_future 而不是 create_task 来避免 context 冲突
             asyncio.ensure_future(self._send_to_channel(f"🤖 {natural_language}"))
 
-        # 尝试解析JSON，如果失败则重试
-        decision = self._parse_json_response(response, max_retries=2)
+        # 解析JSON动作（流式模式下已边接收边解析）
+        decision = self._parse_json_response(response, extractor)
 
         if decision is None:
-            # 如果多次重试都失败，继续下一步而不是停止
+            # 如果解析失败，继续下一步而不是停止
             print("\n⚠️ 无法解析响应，继续下一步...\n")
-            self.step_count += 1
-            context = self._build_context()
-            self._execute_step(user_request, context)
+            return StepOutcome.CONTINUE
+
+        return await self._dispatch_decision(decision, user_request)
+
+    def _report_prompt_render(self) -> None:
+        """Show this step's Agent.md render time and how often the compiled template was reused"""
+        stats = self.prompt_template.get_stats()
+        print(f"📝 提示词渲染: {stats['last_render_ms']:.2f}ms（平均 {stats['avg_render_ms']:.2f}ms，"
+              f"复用编译模板 {stats['cache_hits']}/{stats['render_count']} 次）")
+
+    def format_status(self) -> str:
+        """Human-readable cache metrics for the /status command"""
+        lines = []
+        cache = self.ai_engine.response_cache
+        if cache is not None:
+            stats = cache.get_stats()
+            lines.append(
+                f"🗄️ 响应缓存: 命中 {stats['hits']}/{stats['hits'] + stats['misses']}（{stats['hit_rate']:.0%}），"
+                f"{stats['entries']} 条/{stats['bytes'] / 1024:.0f}KB，淘汰 {stats['evictions']}"
+            )
+        stats = self.skills_loader.probe.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        lines.append(
+            f"🔍 技能依赖探测: 命中 {stats['hits']}/{lookups}（{stats['hits'] / lookups if lookups else 0:.0%}），"
+            f"缓存 {stats['entries']} 项，第 {stats['generation']} 代（TTL {stats['ttl']:.0f}s）"
+        )
+        return "\n".join(lines)
+
+    def _report_prompt_cache(self) -> None:
+        """Show how much of this step's prompt was served from the provider's prompt cache"""
+        usage = self.async_engine.last_usage
+        if not usage or not usage["prompt_tokens"]:
             return
+        ratio = usage["cached_tokens"] / usage["prompt_tokens"]
+        total_ratio = self.async_engine.get_usage_stats()["cached_ratio"]
+        print(f"💾 提示词缓存: {usage['cached_tokens']}/{usage['prompt_tokens']} tokens ({ratio:.0%}，累计 {total_ratio:.0%})")
+
+    async def _execute_native_step(self, user_request: str, user_message: str, system_prompt: list) -> StepOutcome:
+        """Execute a step through native function calling instead of embedded JSON"""
+        result = await self.async_engine.call_api_with_tools(user_message, system_prompt, self.tool_schemas)
+        self._report_prompt_render()
+        self._report_prompt_cache()
+        self.async_engine.clear_history()
+
+        content = result["content"].strip()
+        tool_calls = result["tool_calls"]
+
+        if content.startswith("API Error:"):
+            print(f"{content}\n\n⚠️ 接口调用失败，继续下一步...\n")
+            return StepOutcome.CONTINUE
+
+        # 没有工具调用：回复内容即最终回答（由 respond 分支显示、记录和发送）
+        if not tool_calls:
+            return await self._dispatch_decision({"action": "respond", "response": content}, user_request)
+
+        # 显示AI的说明和工具调用
+        if content:
+            print(content)
+        for call in tool_calls:
+            print(f"🔧 {call['tool']}: {json.dumps(call['params'], ensure_ascii=False)}")
+
+        if content:
+            self.memory_manager.append_execution_step(f"【AI响应】{content}")
+            if self.is_gateway_mode:
+                asyncio.ensure_future(self._send_to_channel(f"🤖 {content}"))
+
+        if len(tool_calls) > 1:
+            decision = {"action": "execute_tools", "calls": tool_calls}
+        else:
+            decision = {"action": "execute_tool", **tool_calls[0]}
+        return await self._dispatch_decision(decision, user_request)
 
+    async def _dispatch_decision(self, decision: dict, user_request: str) -> StepOutcome:
+        """Carry out a parsed step decision"""
         action = decision.get("action")
 
+        # 批量工具调用：只有一个调用时按普通工具调用处理
+        if action == "execute_tools":
+            calls = self._normalize_tool_calls(decision.get("calls", []))
+            if not calls:
+                print("\n⚠️ 批量工具调用为空，继续下一步...\n")
+                return StepOutcome.CONTINUE
+            if len(calls) > 1:
+                return await self._run_tool_batch(calls, [], user_request)
+            decision = calls[0]
+            action = "execute_tool"
+
         # Handle different actions
         if action == "execute_tool":
             tool_name = decision.get("tool", "unknown")
@@ -284,58 +631,31 @@ class NaturalTaskExecutor:
             if not self.allow_all_commands and requires_approval:
                 if self.is_gateway_mode:
                     # 网关模式：发送确认请求到飞书，并等待用户回复
-                    params = decision.get("params", {})
-                    action_desc = self._get_action_description(tool_name, params)
-
-                    approval_msg = f"""
-⚠️ 【需要确认】
+                    self._send_approval_request(tool_name, decision.get("params", {}))
 
-AI 想要执行以下操作：
-{action_desc}
-
-请在飞书中回复：
-- "yes" 或 "y" - 执行此命令
-- "all" 或 "a" - 允许本任务所有命令
-- "no" 或 "n" - 取消此命令
-"""
-                    # 发送到飞书
-                    if self.bus and self.current_channel and self.current_chat_id:
-                        msg = OutboundMessage(
-                            channel=self.current_channel,
-                            chat_id=self.current_chat_id,
-                            content=approval_msg,
-                        )
-                        asyncio.ensure_future(self.bus.publish_outbound(msg))
-
-                    # 保存待执行的决策和上下文
+                    # 保存待执行的决策（上下文会在恢复时重新构建）
                     self.pending_decision = decision
                     self.pending_user_request = user_request
-                    self.pending_context = context
 
                     # 设置等待标志，暂停执行
                     print(f"⏳ 等待用户在飞书中确认...\n")
                     self.waiting_for_approval = True
                     self.approval_response = None
-                    return
+                    return StepOutcome.SUSPEND
                 else:
                     # CLI 模式：使用箭头键选择
                     approval = self._ask_for_approval()
 
                     if approval == "no":
                         print(f"❌ 已取消此命令\n")
-                        self.step_count += 1
-                        context = self._build_context()
-                        self._execute_step(user_request, context)
-                        return
+                        return StepOutcome.CONTINUE
                     elif approval == "all":
                         self.allow_all_commands = True
                         print(f"✅ 已允许本任务所有命令\n")
 
-            self._handle_tool_execution(decision)
+            await self._handle_tool_execution(decision)
             # Continue to next step
-            self.step_count += 1
-            context = self._build_context()
-            self._execute_step(user_request, context)
+            return StepOutcome.CONTINUE
 
         elif action == "respond":
             response_text = decision.get("response", "")
@@ -360,13 +680,10 @@ AI 想要执行以下操作：
 
             # 自动压缩任务记忆
             if self.execution_history:
-                # 从文件中读取完整的近期记忆（不是内存中的片段）
-                all_history = self.memory_manager.load_execution_history()
-                if all_history:
-                    history_text = "\n".join(all_history)
-                    current_tokens = self._estimate_tokens(history_text)
-                else:
-                    # 如果文件为空，使用内存中的历史
+                # 完整近期记忆的token数（随追加增量维护，无需重新扫描全文）
+                current_tokens = self.memory_manager.history_token_count()
+                if not current_tokens:
+                    # 如果记忆为空，使用内存中的历史
                     history_text = "\n".join(self.execution_history)
                     current_tokens = self._estimate_tokens(history_text)
 
@@ -399,15 +716,11 @@ AI 想要执行以下操作：
                     # 近期记忆未超过限制，显示当前token数
                     print(f"📊 近期记忆: {current_tokens}/30000 tokens")
 
+            return StepOutcome.DONE
+
         else:
             print(f"\n⚠️  未知操作: {action}，继续下一步...\n")
-            self.step_count += 1
-            context = self._build_context()
-            self._execute_step(user_request, context)
-
-    async def _execute_step_async(self, user_request: str, context: str):
-        """Async wrapper for _execute_step to avoid nested asyncio issues"""
-        self._execute_step(user_request, context)
+            return StepOutcome.CONTINUE
 
     def _compress_current_task_manual(self) -> None:
         """Manually compress the current execution history into a summary"""
@@ -449,7 +762,8 @@ AI 想要执行以下操作：
 表格："""
 
         try:
-            task_summary = self.ai_engine.call_api(summary_prompt)
+            # 摘要只取决于执行历史，压缩中途失败后重试可直接命中响应缓存
+            task_summary = self.ai_engine.call_api(summary_prompt, cacheable=True)
 
             # 清空AI引擎的对话历史（已保存到执行历史文件）
             self.ai_engine.clear_history()
@@ -473,14 +787,8 @@ AI 想要执行以下操作：
         full_archive_path = str(self.memory_manager.memory_dir / archive_path)
 
         # 添加到累积压缩摘要（新的压缩添加到前面，包含存档路径和简短摘要）
-        if self.accumulated_compression:
-            # 新的压缩摘要添加到前面，包含存档路径和简短摘要（不显示编号）
-            self.accumulated_compression = f"{task_summary}\n📁 详细内容: {full_archive_path}\n\n{self.accumulated_compression}"
-        else:
-            self.accumulated_compression = f"{task_summary}\n📁 详细内容: {full_archive_path}"
-
-        # 保存到记忆文件
-        self.memory_manager.save_accumulated_compression(self.accumulated_compression)
+        # 超出 token 预算时，较早的摘要会在后台合并，不阻塞后续步骤
+        self.compression_tiers.add(f"{task_summary}\n📁 详细内容: {full_archive_path}")
 
         # 彻底清空 AIEngine 的对话历史以减少上下文
         # 压缩摘要已经保存到文件，不需要再保留在内存中
@@ -540,161 +848,171 @@ AI 想要执行以下操作：
         except Exception:
             return ""
 
-    def _parse_json_response(self, response: str, max_retries: int = 2) -> dict:
-        """尝试解析JSON响应，失败时重试"""
-        import re
+    def _parse_json_response(self, response: str, extractor: ActionExtractor | None = None) -> dict:
+        """解析响应中的 JSON 动作（单次线性扫描，容忍未转义引号和代码块标记）
 
-        for attempt in range(max_retries):
-            try:
-                # 首先尝试使用分隔符提取JSON
-                start_marker = "===== JSON START ====="
-                end_marker = "===== JSON END ====="
+        流式模式下传入已边接收边喂入数据的 extractor，避免再扫描一遍全文。
+        """
+        if extractor is None:
+            extractor = ActionExtractor()
+            extractor.feed(response)
+        decision = extractor.finish()
 
-                start_idx = response.find(start_marker)
-                end_idx = response.find(end_marker)
+        if decision is None:
+            if extractor.truncated:
+                # 动作被截断（如超过 MAX_TOKENS）：不执行残缺的动作，记录原因让下一步重试
+                print(f"⚠️  JSON动作不完整（响应被截断），未执行")
+                self.memory_manager.append_execution_step(
+                    "【系统】上一步回复在 JSON 动作中途被截断（可能超过 MAX_TOKENS），动作未执行。"
+                    "请重新给出完整的动作；内容较长时分多次写入。"
+                )
+            elif extractor.end is None:
+                print(f"⚠️  无法找到JSON对象")
+            else:
+                print(f"⚠️  JSON解析错误")
+            print(f"原始响应: {response[:300]}...")
+            return None
+
+        # 自动修复：如果action不是execute_tool/execute_tools/respond，尝试修复
+        if decision.get("action") not in ["execute_tool", "execute_tools", "respond"]:
+            # 检查是否是工具名称被当作action
+            possible_tool = decision.get("action")
+            if "params" in decision:
+                # 这看起来像是工具调用，修复为正确格式
+                decision = {
+                    "action": "execute_tool",
+                    "tool": possible_tool,
+                    "params": decision.get("params", {})
+                }
+
+        return decision
+
+    def _send_approval_request(self, tool_name: str, params: dict, note: str = "") -> None:
+        """Send an approval request for one tool call to the channel (gateway mode)"""
+        action_desc = self._get_action_description(tool_name, params)
+
+        approval_msg = f"""
+⚠️ 【需要确认】{note}
 
-                if start_idx >= 0 and end_idx > start_idx:
-                    # 使用分隔符提取JSON
-                    json_str = response[start_idx + len(start_marker):end_idx].strip()
-                else:
-                    # 备选方案：查找 { 和 }
-                    start_idx = response.find('{')
-                    end_idx = response.rfind('}') + 1
+AI 想要执行以下操作：
+{action_desc}
 
-                    if start_idx < 0 or end_idx <= start_idx:
-                        if attempt == max_retries - 1:
-                            print(f"⚠️  无法找到JSON对象")
-                        continue
+请在飞书中回复：
+- "yes" 或 "y" - 执行此命令
+- "all" 或 "a" - 允许本任务所有命令
+- "no" 或 "n" - 取消此命令
+"""
+        # 发送到飞书
+        if self.bus and self.current_channel and self.current_chat_id:
+            msg = OutboundMessage(
+                channel=self.current_channel,
+                chat_id=self.current_chat_id,
+                content=approval_msg,
+            )
+            asyncio.ensure_future(self.bus.publish_outbound(msg))
 
-                    json_str = response[start_idx:end_idx]
+    @staticmethod
+    def _normalize_tool_calls(calls) -> list:
+        """Turn the calls of an execute_tools action into execute_tool decisions"""
+        if not isinstance(calls, list):
+            return []
+        return [
+            {"action": "execute_tool", "tool": call.get("tool"), "params": call.get("params") or {}}
+            for call in calls
+            if isinstance(call, dict) and call.get("tool")
+        ]
+
+    async def _run_tool_batch(self, calls: list, approvals: list, user_request: str) -> StepOutcome:
+        """Collect approval for each call in order, then run the approved calls concurrently
+
+        approvals holds the decisions already made (True = run, False = rejected);
+        in gateway mode the batch suspends at the first call that needs a reply.
+        """
+        for index, call in enumerate(calls):
+            if index < len(approvals):
+                continue
 
-                # 尝试修复常见的JSON问题
-                json_str = json_str.replace('\n', ' ')  # 移除换行符
-                json_str = json_str.replace('\r', '')   # 移除回车符
+            if self.allow_all_commands or not self._is_tool_requires_approval(call["tool"]):
+                approvals.append(True)
+                continue
 
-                # 移除可能的代码块标记
-                if json_str.startswith('```'):
-                    json_str = json_str[3:]
-                if json_str.endswith('```'):
-                    json_str = json_str[:-3]
-                json_str = json_str.strip()
+            note = f"（批量操作 {index + 1}/{len(calls)}）"
+            if self.is_gateway_mode:
+                self._send_approval_request(call["tool"], call["params"], note)
+
+                # 保存批量决策和已确认的结果，收到回复后从下一个调用继续
+                self.pending_decision = {"action": "execute_tools", "calls": calls, "approvals": approvals}
+                self.pending_user_request = user_request
+
+                print(f"⏳ 等待用户在飞书中确认{note}...\n")
+                self.waiting_for_approval = True
+                self.approval_response = None
+                return StepOutcome.SUSPEND
+
+            # CLI 模式：逐个确认
+            print(f"\n{note} {self._get_action_description(call['tool'], call['params'])}")
+            approval = self._ask_for_approval()
+            if approval == "all":
+                self.allow_all_commands = True
+                print(f"✅ 已允许本任务所有命令\n")
+            elif approval == "no":
+                print(f"❌ 已取消此命令\n")
+            approvals.append(approval != "no")
+
+        await self._handle_tool_batch(calls, approvals)
+        return StepOutcome.CONTINUE
+
+    async def _handle_tool_batch(self, calls: list, approvals: list) -> None:
+        """Run approved calls concurrently (bounded) and record results in call order"""
+        semaphore = asyncio.Semaphore(self.max_parallel_tools)
+
+        async def run(call: dict) -> str:
+            async with semaphore:
+                return await self._run_tool(call)
+
+        print(f"\n⚡ 并行执行 {sum(approvals)} 个工具调用（最多同时 {self.max_parallel_tools} 个）\n")
+        results = await asyncio.gather(
+            *(run(call) for call, approved in zip(calls, approvals) if approved)
+        )
 
-                # 首先尝试直接解析
-                try:
-                    decision = json.loads(json_str)
-
-                    # 自动修复：如果action不是execute_tool或respond，尝试修复
-                    if decision.get("action") not in ["execute_tool", "respond"]:
-                        # 检查是否是工具名称被当作action
-                        possible_tool = decision.get("action")
-                        if "params" in decision:
-                            # 这看起来像是工具调用，修复为正确格式
-                            decision = {
-                                "action": "execute_tool",
-                                "tool": possible_tool,
-                                "params": decision.get("params", {})
-                            }
-
-                    return decision
-                except json.JSONDecodeError as e:
-                    # 如果失败，尝试修复常见问题
-                    error_pos = e.pos if hasattr(e, 'pos') else 0
-
-                    # 修复策略1：处理content字段中的未转义引号
-                    # 对于content字段中的HTML/长文本，需要特殊处理
-                    json_str = re.sub(
-                        r'("content"\s*:\s*")((?:[^"\\]|\\.)*?)(")',
-                        lambda m: m.group(1) + m.group(2).replace('"', '\\"') + m.group(3),
-                        json_str,
-                        flags=re.DOTALL
-                    )
+        # 按调用顺序记录结果，与完成先后无关
+        results_iter = iter(results)
+        for call, approved in zip(calls, approvals):
+            result = next(results_iter) if approved else "❌ 用户拒绝执行此命令"
+            self._record_tool_result(call["tool"], result)
 
-                    try:
-                        decision = json.loads(json_str)
-
-                        # 自动修复：如果action不是execute_tool或respond，尝试修复
-                        if decision.get("action") not in ["execute_tool", "respond"]:
-                            possible_tool = decision.get("action")
-                            if "params" in decision:
-                                decision = {
-                                    "action": "execute_tool",
-                                    "tool": possible_tool,
-                                    "params": decision.get("params", {})
-                                }
-
-                        return decision
-                    except json.JSONDecodeError:
-                        # 修复策略2：处理 HTML 内容中的引号
-                        json_str = re.sub(r'(?<=[a-zA-Z0-9])"(?=[a-zA-Z0-9=])', '\\"', json_str)
+    async def _handle_tool_execution(self, decision: dict):
+        """Execute a tool"""
+        result = await self._run_tool(decision)
+        self._record_tool_result(decision.get("tool"), result)
 
-                        try:
-                            decision = json.loads(json_str)
-
-                            # 自动修复：如果action不是execute_tool或respond，尝试修复
-                            if decision.get("action") not in ["execute_tool", "respond"]:
-                                possible_tool = decision.get("action")
-                                if "params" in decision:
-                                    decision = {
-                                        "action": "execute_tool",
-                                        "tool": possible_tool,
-                                        "params": decision.get("params", {})
-                                    }
-
-                            return decision
-                        except json.JSONDecodeError:
-                            # 修复策略3：尝试找到最后一个完整的JSON对象
-                            # 从后往前找，确保JSON是完整的
-                            for i in range(len(json_str) - 1, 0, -1):
-                                if json_str[i] == '}':
-                                    try:
-                                        decision = json.loads(json_str[:i+1])
-
-                                        # 自动修复：如果action不是execute_tool或respond，尝试修复
-                                        if decision.get("action") not in ["execute_tool", "respond"]:
-                                            possible_tool = decision.get("action")
-                                            if "params" in decision:
-                                                decision = {
-                                                    "action": "execute_tool",
-                                                    "tool": possible_tool,
-                                                    "params": decision.get("params", {})
-                                                }
-
-                                        return decision
-                                    except json.JSONDecodeError:
-                                        continue
-
-            except json.JSONDecodeError as e:
-                if attempt == max_retries - 1:
-                    print(f"⚠️  JSON解析错误: {str(e)}")
-                    print(f"原始响应: {response[:300]}...")
-                continue
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    print(f"⚠️  错误: {e}")
-                continue
+    def _record_tool_result(self, tool_name: str, result: str) -> None:
+        """Print a tool result and append it to the execution history"""
+        # 显示执行结果
+        print(f"\n执行结果:\n{result}\n")
+
+        # 完整保存到记忆（不截断）
+        history_entry = f"执行 {tool_name}: {result}"
+        self.execution_history.append(history_entry)
 
-        return None
+        # 同步保存到记忆文件（确保下一步能读到）
+        self.memory_manager.append_execution_step(history_entry)
 
-    def _handle_tool_execution(self, decision: dict):
-        """Execute a tool"""
+    async def _run_tool(self, decision: dict) -> str:
+        """Run one tool call and return its result"""
         tool_name = decision.get("tool")
         params = decision.get("params", {})
 
         # 如果是网络搜索，检查是否超过限制
         if tool_name == "web_search":
             if self.web_search_count >= self.max_web_searches:
-                result = f"⚠️ 已达到网络搜索限制({self.max_web_searches}次)，请基于已有信息给出结论"
-                print(f"\n执行结果:\n{result}\n")
-                history_entry = f"执行 {tool_name}: {result}"
-                self.execution_history.append(history_entry)
-                # 保存到记忆文件
-                self.memory_manager.append_execution_step(history_entry)
-                return
+                return f"⚠️ 已达到网络搜索限制({self.max_web_searches}次)，请基于已有信息给出结论"
             self.web_search_count += 1
 
         # 如果是设置定时器，传入执行器引用
         if tool_name == "set_timer":
-            params["executor"] = self
+            self._timer_fired = asyncio.get_running_loop().create_future()
+            params["on_fire"] = self._timer_callback(self._timer_fired)
             self.waiting_for_timer = True
             self.timer_triggered = False
 
@@ -702,15 +1020,8 @@ AI 想要执行以下操作：
         if tool_name == "send_file":
             if self.is_gateway_mode and self.bus and self.current_channel and self.current_chat_id:
                 file_path = params.get("path", "") or params.get("file_path", "")
-                result = self._send_file_to_channel(file_path)
-            else:
-                result = "❌ send_file 工具仅在网关模式下可用"
-            print(f"\n执行结果:\n{result}\n")
-            history_entry = f"执行 {tool_name}: {result}"
-            self.execution_history.append(history_entry)
-            # 保存到记忆文件
-            self.memory_manager.append_execution_step(history_entry)
-            return
+                return self._send_file_to_channel(file_path)
+            return "❌ send_file 工具仅在网关模式下可用"
 
         # 如果是生成PDF，处理参数映射（支持 input/input_path 和 output/output_path 两种方式）
         if tool_name == "generate_pdf":
@@ -722,25 +1033,8 @@ AI 想要执行以下操作：
 
         # Execute the tool
         tool_call = {"tool": tool_name, "params": params}
-        result = self.tool_executor.execute(tool_call)
+        return await self.tool_runner.run(self.tool_executor, tool_call, owner=self)
 
-        # 显示执行结果
-        print(f"\n执行结果:\n{result}\n")
-
-        # 完整保存到记忆（不截断）
-        history_entry = f"执行 {tool_name}: {result}"
-        self.execution_history.append(history_entry)
-
-        # 同步保存到记忆文件（确保下一步能读到）
-        self.memory_manager.append_execution_step(history_entry)
-
-        # 如果设置了定时器，等待其触发
-        if tool_name == "set_timer" and self.waiting_for_timer:
-            print("⏳ 等待定时器触发...\n")
-            import time
-            while self.waiting_for_timer and not self.timer_triggered:
-                time.sleep(0.5)
-            print("✅ 定时器已触发，继续执行任务\n")
 
     def _ask_for_approval(self) -> str:
         """Ask user for approval to execute command with arrow keys"""
@@ -850,6 +1144,7 @@ AI 想要执行以下操作：
             "web_search",      # 网络搜索
             "read_url",        # 读取URL
             "set_timer",       # 设置定时器
+            "memory_search",   # 搜索历史记忆
         }
         return tool_name not in safe_tools
 
@@ -873,6 +1168,7 @@ AI 想要执行以下操作：
             "create_file": f"创建文件 {params.get('path')}",
             "send_file": f"发送文件到飞书 {params.get('path')}",
             "load_skill": f"加载 skill: {params.get('skill_name')}",
+            "memory_search": f"搜索历史记忆: {params.get('query')}",
         }
         return descriptions.get(tool_name, f"执行 {tool_name}")
 
@@ -964,7 +1260,7 @@ AI 想要执行以下操作：
         self.allow_all_commands = False
 
         # 清空压缩摘要链
-        self.accumulated_compression = ""
+        self.compression_tiers.clear()
         self.task_compression_summary = ""
 
         # 清除记忆文件
@@ -1093,11 +1389,53 @@ async def gateway_mode():
     # Create channel manager
     channel_manager = ChannelManager(config, bus)
 
-    # Create executor with bus
-    executor = NaturalTaskExecutor(bus=bus)
-
-    # Save event loop for background compression notifications
-    executor.event_loop = asyncio.get_running_loop()
+    # 每个聊天（session_key）一个执行器：状态和记忆互相隔离，不同聊天的任务可并发执行
+    event_loop = asyncio.get_running_loop()
+    workspace_path = Path(__file__).parent / "workspace"
+    workspace_path.mkdir(exist_ok=True)
+    shared_skills_loader = SkillsLoader(workspace_path)
+    shared_prompt_template = PromptTemplate(Path(__file__).parent / "Agent.md")
+    shared_tool_runner = ToolRunner()
+
+    def create_executor(session_key: str) -> NaturalTaskExecutor:
+        """Create the executor for one chat session."""
+        executor = NaturalTaskExecutor(
+            bus=bus,
+            session_key=session_key,
+            skills_loader=shared_skills_loader,
+            prompt_template=shared_prompt_template,
+            tool_runner=shared_tool_runner,
+        )
+        # Save event loop for background compression notifications
+        executor.event_loop = event_loop
+        # 挂起的任务（如等待定时器）恢复时重新进入本会话的队列
+        executor.run_in_session = lambda coro: sessions.run(sessions.sessions[session_key], coro)
+        return executor
+
+    sessions = SessionManager(create_executor)
+
+    async def run_task(executor, msg):
+        """Reset per-task state and execute a new task."""
+        # Store message context
+        executor.current_sender_id = msg.sender_id
+        executor.current_chat_id = msg.chat_id
+        executor.current_channel = msg.channel
+
+        # Reset execution state for new message
+        executor._cleanup_large_results()  # 清理上一个任务的大型网页结果
+        executor.ai_engine.truncate_web_results(max_length=300)  # 截断AI引擎对话历史中的网页结果
+        executor.ai_engine.clear_history()  # 清空AI引擎的对话历史
+        # 不清空 execution_history，让它积累所有任务的执行历史
+        # 直到用户输入 /compact 时才压缩
+        executor.step_count = 0  # 重置步数计数器（每个新任务重新开始计数）
+        executor.web_search_count = 0  # 重置搜索计数
+        executor.allow_all_commands = False
+        executor.should_stop = False
+
+        # Execute task
+        print(f"🤖 【AI 开始处理】[{msg.session_key}]\n")
+        await executor.execute_task(msg.content)
+        print(f"\n✅ 【处理完成】[{msg.session_key}]\n")
 
     # Start channels and message processing
     async def process_messages():
@@ -1109,65 +1447,38 @@ async def gateway_mode():
 
                 print(f"\n{'='*60}")
                 print(f"📨 【收到飞书消息】")
+                print(f"会话: {msg.session_key}")
                 print(f"发送者: {msg.sender_id}")
                 print(f"内容: {msg.content}")
                 print(f"{'='*60}\n")
 
-                # 检查是否在等待用户确认
+                session = await sessions.get(msg.session_key)
+                executor = session.executor
+
+                # 检查是否在等待用户确认（只处理本会话的确认回复）
                 if executor.waiting_for_approval:
                     print(f"✅ 【收到用户确认】\n")
                     response = msg.content.lower().strip()
 
-                    if response in ['yes', 'y']:
-                        print(f"✅ 用户同意执行命令\n")
-                        executor.waiting_for_approval = False
-                        executor.approval_response = "yes"
-
-                        # 执行待执行的命令
-                        if executor.pending_decision:
-                            print(f"🤖 【继续执行命令】\n")
-                            decision = executor.pending_decision
-
-                            # 执行工具
-                            executor._handle_tool_execution(decision)
+                    if response in ['yes', 'y', 'all', 'a']:
+                        approval = "all" if response in ['all', 'a'] else "yes"
+                        if approval == "all":
+                            print(f"✅ 用户允许所有命令\n")
+                        else:
+                            print(f"✅ 用户同意执行命令\n")
 
-                            # 继续下一步 - 使用ensure_future避免嵌套asyncio问题
-                            executor.step_count += 1
-                            context = executor._build_context()
-                            asyncio.ensure_future(executor._execute_step_async(executor.pending_user_request, context))
-
-                            executor.pending_decision = None
-                            executor.pending_user_request = None
-                            executor.pending_context = None
-                        continue
-
-                    elif response in ['all', 'a']:
-                        print(f"✅ 用户允许所有命令\n")
-                        executor.allow_all_commands = True
+                        # 立即清除等待标志，避免后续消息被当作确认回复
                         executor.waiting_for_approval = False
-                        executor.approval_response = "all"
-
-                        # 执行待执行的命令
                         if executor.pending_decision:
                             print(f"🤖 【继续执行命令】\n")
-                            decision = executor.pending_decision
-                            executor._handle_tool_execution(decision)
-                            executor.step_count += 1
-                            context = executor._build_context()
-                            asyncio.ensure_future(executor._execute_step_async(executor.pending_user_request, context))
-
-                            executor.pending_decision = None
-                            executor.pending_user_request = None
-                            executor.pending_context = None
+                        # 执行待执行的命令并从下一步继续调度
+                        asyncio.ensure_future(sessions.run(session, executor.resume_after_approval(approval)))
                         continue
 
                     elif response in ['no', 'n']:
                         print(f"❌ 用户拒绝执行命令\n")
                         executor.waiting_for_approval = False
-                        executor.approval_response = "no"
-                        executor.pending_decision = None
-                        executor.pending_user_request = None
-                        executor.pending_context = None
+                        asyncio.ensure_future(sessions.run(session, executor.resume_after_approval("no")))
 
                         # 发送拒绝消息
                         reject_msg = OutboundMessage(
@@ -1204,16 +1515,22 @@ async def gateway_mode():
                     executor.should_stop = True
                     executor.waiting_for_approval = False
                     executor.pending_decision = None
+                    executor.cancel_tools()  # 取消正在执行的工具（终止 shell 命令）
+                    executor.cancel_timers()  # 放弃挂起等待定时器的任务
                     await executor._send_to_channel("⏹️ 任务已停止")
                     continue
 
+                # Check for /status command（出站队列、限流、重试和缓存情况）
+                if msg.content.lower().strip() == "/status":
+                    status = [channel_manager.format_outbound_stats(), executor.format_status()]
+                    await executor._send_to_channel("\n".join(line for line in status if line))
+                    continue
+
                 # Check for /compact command
                 if msg.content.lower().strip() == "/compact":
-                    # 显示当前记忆大小（从文件读取完整历史）
-                    all_history = executor.memory_manager.load_execution_history()
-                    if all_history:
-                        history_text = "\n".join(all_history)
-                        current_tokens = executor._estimate_tokens(history_text)
+                    # 显示当前记忆大小（增量维护的token累计值）
+                    current_tokens = executor.memory_manager.history_token_count()
+                    if current_tokens:
                         compact_msg = f"📊 近期记忆: {current_tokens} tokens，正在压缩..."
                     else:
                         compact_msg = "⏳ 正在压缩任务历史记录..."
@@ -1221,7 +1538,6 @@ async def gateway_mode():
                     await executor._send_to_channel(compact_msg)
                     # 在后台线程中执行压缩（不等待）
                     import threading
-                    event_loop = asyncio.get_running_loop()
                     compression_thread = threading.Thread(
                         target=executor._compress_and_notify,
                         args=(event_loop,),
@@ -1230,21 +1546,8 @@ async def gateway_mode():
                     compression_thread.start()
                     continue
 
-                # Reset execution state for new message
-                executor._cleanup_large_results()  # 清理上一个任务的大型网页结果
-                executor.ai_engine.truncate_web_results(max_length=300)  # 截断AI引擎对话历史中的网页结果
-                executor.ai_engine.clear_history()  # 清空AI引擎的对话历史
-                # 不清空 execution_history，让它积累所有任务的执行历史
-                # 直到用户输入 /compact 时才压缩
-                executor.step_count = 0  # 重置步数计数器（每个新任务重新开始计数）
-                executor.web_search_count = 0  # 重置搜索计数
-                executor.allow_all_commands = False
-                executor.should_stop = False
-
-                # Execute task
-                print(f"🤖 【AI 开始处理】\n")
-                executor.execute_task(msg.content)
-                print(f"\n✅ 【处理完成】\n")
+                # 在后台执行任务，不阻塞消息循环
+                asyncio.ensure_future(sessions.run(session, run_task(executor, msg)))
 
             except asyncio.TimeoutError:
                 continue
@@ -1258,11 +1561,34 @@ async def gateway_mode():
         await asyncio.gather(
             channel_manager.start_all(),
             process_messages(),
+            sessions.evict_idle_loop(),
+            channel_manager.report_outbound_loop(),
             return_exceptions=True
         )
     except KeyboardInterrupt:
         print("\n\n🛑 正在关闭...\n")
         await channel_manager.stop_all()
+        await sessions.close_all()
+        shared_tool_runner.shutdown()
+
+
+def migrate_memory():
+    """Migrate the file-based Memory folder into the SQLite memory store."""
+    from agent.core.sqlite_memory import SQLiteMemoryManager
+
+    memory_dir = Path(__file__).parent / "Memory"
+    print(f"\n📦 正在迁移记忆文件到 SQLite: {memory_dir / 'memory.db'}\n")
+
+    store = SQLiteMemoryManager(str(memory_dir))
+    counts = store.migrate_from_files()
+    store.close()
+
+    print(f"✅ 迁移完成")
+    print(f"  累积压缩摘要: {counts['compression']}")
+    print(f"  执行历史条目: {counts['steps']}")
+    print(f"  索引条目: {counts['index_entries']}")
+    print(f"  存档文件: {counts['archives']}")
+    print(f"\n💡 在 .env 中设置 MEMORY_BACKEND=sqlite 以启用 SQLite 存储\n")
 
 
 def main():
@@ -1302,11 +1628,9 @@ def main():
 
             # Handle /compact command
             if user_input.lower().strip() == "/compact":
-                # 显示当前记忆大小（从文件读取完整历史）
-                all_history = executor.memory_manager.load_execution_history()
-                if all_history:
-                    history_text = "\n".join(all_history)
-                    current_tokens = executor._estimate_tokens(history_text)
+                # 显示当前记忆大小（增量维护的token累计值）
+                current_tokens = executor.memory_manager.history_token_count()
+                if current_tokens:
                     print(f"📊 近期记忆: {current_tokens} tokens，正在压缩...\n")
                 else:
                     print(f"⚠️  没有执行历史可以压缩\n")
@@ -1330,7 +1654,7 @@ def main():
             executor.allow_all_commands = False  # 重置命令允许状态
 
             print()
-            executor.execute_task(user_input)
+            executor.run_sync(executor.execute_task(user_input))
 
         except KeyboardInterrupt:
             print("\n\n⚠️  任务已中断")
@@ -1347,5 +1671,7 @@ if __name__ == "__main__":
     # Check for gateway mode
     if len(sys.argv) > 1 and sys.argv[1] == "gateway":
         asyncio.run(gateway_mode())
+    elif len(sys.argv) > 1 and sys.argv[1] == "migrate-memory":
+        migrate_memory()
     else:
         main()
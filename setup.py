@@ -28,6 +28,7 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "requests>=2.28.0",
+        "httpx>=0.24.0",
         "python-dotenv>=0.20.0",
         "rich>=13.0.0",
         "beautifulsoup4>=4.11.0",